@@ -0,0 +1,314 @@
+"""Batch generation of display pictures from a roster manifest.
+
+Usage:
+    python -m backend.batch MANIFEST PHOTOS -o OUTPUT.zip [--workers N]
+        [--template-id ID] [--font-id ID] [--format FORMAT]
+
+MANIFEST is a CSV file with a header row, or a JSON list of objects. Each
+row needs a ``photo`` column naming a file in PHOTOS (a directory or a zip
+archive) and may set ``username``, ``template_id``, ``font_id`` and any of
+the position and output parameters accepted by /api/process-image.
+"""
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import sys
+import time
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from backend.config import (
+    BATCH_ARCHIVE_MAX_BYTES,
+    BATCH_WORKERS,
+    DEFAULT_FONT_PATH,
+    DEFAULT_TEMPLATE_PATH,
+    MAX_CONTENT_LENGTH,
+    OUTPUT_FORMATS,
+)
+from backend.services.encoders import encoder_for_data
+from backend.services.image_processor import RenderSpec
+from backend.services.metrics import metrics_directory
+from backend.services.render_pool import RenderPoolFull, init_worker, render_in_worker
+from backend.services.upload_store import get_upload_store
+from backend.utils.logger import get_logger
+from backend.utils.validators import (
+    OUTPUT_PARAM_KEYS,
+    POSITION_PARAM_KEYS,
+    ValidationError,
+    resolve_upload_path,
+    validate_image_file,
+    validate_output_params,
+    validate_position_params,
+)
+
+logger = get_logger()
+
+REPORT_NAME = "report.json"
+
+POOL_FULL_WAIT_SECONDS = 0.05
+
+
+def load_manifest(stream, filename: str) -> list:
+    """Parse a CSV or JSON manifest into a list of row dicts."""
+    text = stream.read()
+    if isinstance(text, bytes):
+        text = text.decode("utf-8-sig")
+
+    if Path(filename).suffix.lower() == ".json":
+        data = json.loads(text)
+        rows = data.get("items", []) if isinstance(data, dict) else data
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValidationError("Manifest must be a list of rows")
+    return rows
+
+
+def _resolve_resource(kind: str, file_id: str, default: Path) -> Path:
+    """Resolve a template or font id, or an alias of one, for a batch row."""
+    if not file_id:
+        return default
+
+    path = get_upload_store().path(kind, file_id)
+    if path is None:
+        raise ValidationError(f"Unknown {kind}: {file_id}")
+    return path
+
+
+def build_spec(row: dict, defaults: dict = None) -> RenderSpec:
+    """Validate a manifest row, filling gaps from defaults, and build its spec."""
+    merged = dict(defaults or {})
+    merged.update({key: value for key, value in row.items() if value not in (None, "")})
+
+    params = {key: merged[key] for key in POSITION_PARAM_KEYS if key in merged}
+    validated_params = validate_position_params(params)
+    validated_params.update(validate_output_params({key: merged[key] for key in OUTPUT_PARAM_KEYS if key in merged}))
+
+    return RenderSpec(
+        username=str(merged.get("username", "")).strip(),
+        template_path=_resolve_resource("template", merged.get("template_id"), DEFAULT_TEMPLATE_PATH),
+        font_path=_resolve_resource("font", merged.get("font_id"), DEFAULT_FONT_PATH),
+        **validated_params,
+    )
+
+
+def render_rows(rows: list, load_photo, defaults: dict = None, workers: int = BATCH_WORKERS, pool=None):
+    """Render rows across worker processes, yielding results as they finish.
+
+    load_photo(name) must return the photo bytes. Yields tuples of
+    (index, row, buffer, error) where exactly one of buffer and error is set.
+    With pool, a shared RenderPool, renders are queued there and the batch
+    waits for its own renders while the pool is full; otherwise a private
+    pool of workers processes is started for the batch, as the CLI does.
+    At most 2 * workers renders are in flight, which bounds memory use.
+    """
+    executor = None
+    if pool is None:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(metrics_directory(),),
+        )
+    else:
+        workers = pool.workers
+    pending = {}
+
+    def finished(futures):
+        for future in futures:
+            index, row = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                yield index, row, future.result(), None
+            else:
+                logger.error(f"Batch item {index} failed: {error}")
+                yield index, row, None, "Failed to process image"
+
+    try:
+        for index, row in enumerate(rows):
+            while len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+
+            try:
+                photo = row.get("photo")
+                if not photo:
+                    raise ValidationError("Missing photo")
+                spec = build_spec(row, defaults)
+                image_data = load_photo(photo)
+            except ValidationError as e:
+                yield index, row, None, str(e)
+                continue
+            except (KeyError, OSError):
+                yield index, row, None, f"Photo not found: {row.get('photo')}"
+                continue
+
+            while True:
+                try:
+                    if executor is not None:
+                        future = executor.submit(render_in_worker, spec, image_data)
+                    else:
+                        future = pool.submit(spec, image_data)
+                    break
+                except RenderPoolFull:
+                    if pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from finished(done)
+                    else:
+                        time.sleep(POOL_FULL_WAIT_SECONDS)
+            pending[future] = (index, row)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in pending:
+                future.cancel()
+
+
+def _result_name(index: int, row: dict, extension: str) -> str:
+    """Name a rendered image inside the output archive."""
+    stem = str(row.get("username") or "") or Path(str(row.get("photo", ""))).stem
+    return f"{index + 1:04d}-{secure_filename(stem) or 'dp'}{extension}"
+
+
+class _StreamSink:
+    """Write-only file object that collects zip output for streaming."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self):
+        """Yield and forget everything written so far."""
+        chunks, self._chunks = self._chunks, []
+        yield from chunks
+
+
+def write_results_zip(results, fileobj):
+    """Write results from render_rows into a zip archive as they arrive.
+
+    Yields one report entry per item after it is written. The archive ends
+    with report.json listing every item in manifest order.
+    """
+    report = []
+
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED) as archive:
+        for index, row, buffer, error in results:
+            entry = {"row": index + 1, "photo": row.get("photo"), "username": row.get("username")}
+            if error is None:
+                entry["status"] = "ok"
+                entry["file"] = _result_name(index, row, encoder_for_data(buffer.getbuffer()).extension)
+                archive.writestr(entry["file"], buffer.getbuffer())
+            else:
+                entry["status"] = "error"
+                entry["error"] = error
+            report.append(entry)
+            yield entry
+
+        report.sort(key=lambda entry: entry["row"])
+        archive.writestr(REPORT_NAME, json.dumps(report, indent=2))
+
+
+def stream_results_zip(results):
+    """Yield the bytes of a results zip chunk by chunk for a streaming response."""
+    sink = _StreamSink()
+    for _ in write_results_zip(results, sink):
+        yield from sink.drain()
+    yield from sink.drain()
+
+
+def zip_photo_loader(source, max_photo_bytes: int = MAX_CONTENT_LENGTH, max_total_bytes: int = BATCH_ARCHIVE_MAX_BYTES):
+    """Build a load_photo callable over a zip archive, matching on file name.
+
+    Members are validated like uploaded photos. No more than max_photo_bytes
+    is decompressed per member or max_total_bytes per archive, whatever the
+    headers claim, so a zip bomb cannot exhaust memory. Oversized, corrupt or
+    non-image members raise ValidationError for their row.
+    """
+    archive = zipfile.ZipFile(source)
+    names = {Path(name).name: name for name in archive.namelist() if not name.endswith("/")}
+    remaining = max_total_bytes
+
+    def load_photo(name):
+        nonlocal remaining
+        name = Path(name).name
+        member = names[name]
+        limit = min(max_photo_bytes, remaining)
+        try:
+            with archive.open(member) as f:
+                data = f.read(limit + 1)
+        except (zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError, EOFError) as e:
+            logger.warning(f"Batch archive member {member} could not be read: {e}")
+            raise ValidationError(f"Photo could not be read from the archive: {name}")
+
+        if len(data) > limit and limit < max_photo_bytes:
+            raise ValidationError("Archive photos exceed the total size limit")
+        remaining -= min(len(data), limit)
+        validate_image_file(FileStorage(io.BytesIO(data), filename=name), max_photo_bytes)
+        return data
+
+    return load_photo
+
+
+def dir_photo_loader(directory: Path):
+    """Build a load_photo callable over a directory of photos."""
+    def load_photo(name):
+        path = resolve_upload_path(directory, name)
+        if path is None:
+            raise KeyError(name)
+        return path.read_bytes()
+    return load_photo
+
+
+def main(argv=None) -> int:
+    """Run a batch from the command line."""
+    parser = argparse.ArgumentParser(prog="python -m backend.batch", description="Generate DPs for a roster.")
+    parser.add_argument("manifest", type=Path, help="CSV or JSON manifest")
+    parser.add_argument("photos", type=Path, help="directory or zip archive of photos")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="zip file to write")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="worker processes")
+    parser.add_argument("--template-id", help="default uploaded template id")
+    parser.add_argument("--font-id", help="default uploaded font id")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="output image format")
+    args = parser.parse_args(argv)
+
+    with open(args.manifest, "rb") as f:
+        rows = load_manifest(f, args.manifest.name)
+
+    defaults = {"template_id": args.template_id, "font_id": args.font_id, "output_format": args.format}
+    load_photo = dir_photo_loader(args.photos) if args.photos.is_dir() else zip_photo_loader(args.photos)
+    results = render_rows(rows, load_photo, defaults, args.workers)
+
+    failures = 0
+    with open(args.output, "wb") as f:
+        for entry in write_results_zip(results, f):
+            if entry["status"] == "ok":
+                print(f"[{entry['row']}] {entry['file']}")
+            else:
+                failures += 1
+                print(f"[{entry['row']}] {entry['photo']}: {entry['error']}", file=sys.stderr)
+
+    print(f"{len(rows) - failures}/{len(rows)} rendered into {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
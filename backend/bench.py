@@ -0,0 +1,318 @@
+"""Benchmark harness for the render pipeline.
+
+Usage:
+    python -m backend.bench [-o RESULTS.json] [--iterations N] [--max-workers N]
+        [--font PATH ...] [--baseline OLD.json --threshold 0.10]
+
+Renders generated photos (several sizes in JPEG, PNG, WebP and HEIC) through
+the real ImageProcessor, varying shape, username length, template, font and
+output encoding. Reports the median time of each pipeline stage and the output
+size per case, throughput with 1..N threads and worker processes, and peak
+RSS. With --baseline, the run is compared against an earlier JSON report and
+exits with status 1 if any case got slower, or any throughput level dropped,
+by more than the threshold.
+"""
+
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import PIL
+import pillow_heif
+from PIL import Image
+
+from backend.config import DEFAULT_FONT_PATH, DEFAULT_TEMPLATE_PATH
+from backend.services.image_processor import ImageProcessor, RenderSpec
+from backend.services.render_pool import init_worker, render_in_worker
+from backend.services.template_store import remove_prepared
+from backend.utils.heif import register_heif_support
+from backend.utils.logger import get_logger, setup_logger
+from backend.utils.timing import StageTimer
+
+logger = get_logger()
+
+PHOTO_SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+PHOTO_FORMATS = ["JPEG", "PNG", "WEBP", "HEIF"]
+USERNAMES = {"short": "Ada Lovelace", "long": "Maximilian Alexander Montgomery-Fitzgerald"}
+STAGES = ["decode", "resize", "mask", "composite", "text", "preview", "encode", "base64"]
+OUTPUT_OPTIONS = {
+    "jpeg-progressive": {"output_format": "jpeg-progressive"},
+    "webp": {"output_format": "webp"},
+    "png": {"output_format": "png"},
+    "avif": {"output_format": "avif"},
+    "target60kb": {"target_kb": 60},
+    "preview": {"preview": True},
+}
+BASELINE_PHOTO = ("JPEG", (1920, 1080))
+BASELINE_CASE = "jpeg-1920x1080-circle-short-default-default"
+CUSTOM_TEMPLATE_NAME = "custom_template.png"
+
+
+@dataclass(frozen=True)
+class BenchCase:
+    """One render configuration to time."""
+
+    name: str
+    spec: RenderSpec
+    photo: bytes
+
+
+def make_photo(size: tuple, fmt: str) -> bytes:
+    """Generate a noisy gradient photo so encoders see realistic content."""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 48)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+    buffer = io.BytesIO()
+    if fmt == "PNG":
+        image.save(buffer, fmt)
+    else:
+        image.save(buffer, fmt, quality=90)
+    return buffer.getvalue()
+
+
+def make_template(path: Path, size: tuple) -> Path:
+    """Generate a frame template with a transparent window for the photo."""
+    image = Image.new("RGBA", size, (24, 64, 160, 255))
+    window = Image.new("RGBA", (size[0] // 2, size[1] // 2), (0, 0, 0, 0))
+    image.paste(window, (size[0] // 4, size[1] // 4))
+    image.save(path, "PNG")
+    return path
+
+
+def build_cases(workdir: Path, fonts: list) -> list:
+    """Build the case matrix, failing if any photo format cannot be generated."""
+    register_heif_support()
+    photos = {}
+    for fmt in PHOTO_FORMATS:
+        for size in PHOTO_SIZES:
+            try:
+                photos[fmt, size] = make_photo(size, fmt)
+            except (OSError, KeyError, ValueError) as e:
+                raise RuntimeError(f"Cannot generate {fmt} fixtures: {e}") from e
+
+    templates = {
+        "default": DEFAULT_TEMPLATE_PATH,
+        "custom": make_template(workdir / CUSTOM_TEMPLATE_NAME, (2048, 2048)),
+    }
+    font_paths = {"default": DEFAULT_FONT_PATH}
+    font_paths.update({Path(font).stem: Path(font) for font in fonts})
+
+    def case(fmt, size, shape="circle", username="short", template="default", font="default", output=None):
+        name = f"{fmt.lower()}-{size[0]}x{size[1]}-{shape}-{username}-{template}-{font}"
+        if output:
+            name += f"-{output}"
+        spec = RenderSpec(
+            username=USERNAMES[username],
+            template_path=templates[template],
+            font_path=font_paths[font],
+            image_shape=shape,
+            **OUTPUT_OPTIONS.get(output, {}),
+        )
+        return BenchCase(name, spec, photos[fmt, size])
+
+    cases = [case(fmt, size) for fmt, size in photos]
+    base_fmt, base_size = BASELINE_PHOTO
+    cases.append(case(base_fmt, base_size, shape="rectangle"))
+    cases.append(case(base_fmt, base_size, username="long"))
+    cases.append(case(base_fmt, base_size, template="custom"))
+    cases.extend(case(base_fmt, base_size, font=font) for font in font_paths if font != "default")
+    cases.extend(case(base_fmt, base_size, output=output) for output in OUTPUT_OPTIONS)
+    return cases
+
+
+def time_case(processor: ImageProcessor, case: BenchCase, iterations: int) -> dict:
+    """Render a case repeatedly and return median stage and total times in ms."""
+    output_bytes = processor.render_to_buffer(case.spec, case.photo).getbuffer().nbytes
+
+    totals = []
+    stages = {stage: [] for stage in STAGES}
+    for _ in range(iterations):
+        timer = StageTimer()
+        start = time.perf_counter()
+        processor.render(case.spec, case.photo, timer)
+        totals.append(time.perf_counter() - start)
+        for stage in STAGES:
+            stages[stage].append(timer.stages.get(stage, 0.0))
+
+    return {
+        "total_ms": round(statistics.median(totals) * 1000, 3),
+        "min_ms": round(min(totals) * 1000, 3),
+        "bytes": output_bytes,
+        "stages_ms": {stage: round(statistics.median(values) * 1000, 3) for stage, values in stages.items()},
+    }
+
+
+def _init_bench_worker() -> None:
+    """Warm a worker like the render pool does, without per-render log lines."""
+    setup_logger(level=logging.WARNING)
+    init_worker()
+
+
+def _process_peak_rss() -> int:
+    """Return this process's peak RSS in bytes.
+
+    VmHWM is used where available because ru_maxrss survives exec, so a
+    spawned worker would otherwise report its parent's peak.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def measure_throughput(case: BenchCase, mode: str, workers: int, renders: int) -> tuple:
+    """Return (renders per second, peak worker RSS in bytes) for a case.
+
+    The RSS is None for threads, which share the main process.
+    """
+    if mode == "threads":
+        processor = ImageProcessor()
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda: executor.submit(processor.render_to_buffer, case.spec, case.photo)
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_bench_worker,
+        )
+        submit = lambda: executor.submit(render_in_worker, case.spec, case.photo)
+
+    try:
+        for future in [submit() for _ in range(workers)]:
+            future.result()
+
+        start = time.perf_counter()
+        for future in [submit() for _ in range(renders)]:
+            future.result()
+        rate = round(renders / (time.perf_counter() - start), 2)
+
+        worker_rss = None
+        if mode == "processes":
+            worker_rss = max(executor.submit(_process_peak_rss).result() for _ in range(workers))
+        return rate, worker_rss
+    finally:
+        executor.shutdown(wait=True)
+
+
+def worker_levels(max_workers: int) -> list:
+    """Return 1, 2, 4, ... up to and including max_workers."""
+    levels = []
+    level = 1
+    while level < max_workers:
+        levels.append(level)
+        level *= 2
+    levels.append(max_workers)
+    return levels
+
+
+def run(iterations: int, max_workers: int, renders: int, fonts: list, throughput: bool) -> dict:
+    """Run the benchmark and return the report."""
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "pillow_heif": pillow_heif.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": iterations,
+        },
+        "cases": {},
+        "throughput": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="dp-bench-") as workdir:
+        cases = build_cases(Path(workdir), fonts)
+
+        processor = ImageProcessor()
+        for case in cases:
+            report["cases"][case.name] = result = time_case(processor, case, iterations)
+            print(f"{case.name:<60} {result['total_ms']:>9.2f} ms {result['bytes'] // 1024:>6} KB  " + "  ".join(
+                f"{stage}={result['stages_ms'][stage]:.2f}" for stage in STAGES
+            ))
+
+        worker_rss = 0
+        if throughput:
+            baseline = next(case for case in cases if case.name == BASELINE_CASE)
+            for mode in ("threads", "processes"):
+                report["throughput"][mode] = {}
+                for workers in worker_levels(max_workers):
+                    rate, rss = measure_throughput(baseline, mode, workers, renders)
+                    report["throughput"][mode][str(workers)] = rate
+                    worker_rss = max(worker_rss, rss or 0)
+                    print(f"throughput {mode:<9} workers={workers:<3} {rate:>8.2f} renders/s")
+
+        remove_prepared(Path(workdir) / CUSTOM_TEMPLATE_NAME)
+
+    report["peak_rss_bytes"] = {"main": _process_peak_rss(), "workers": worker_rss}
+    print(f"peak RSS main={report['peak_rss_bytes']['main'] / 2**20:.1f} MiB "
+          f"workers={report['peak_rss_bytes']['workers'] / 2**20:.1f} MiB")
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Return descriptions of every regression beyond threshold against baseline."""
+    regressions = []
+    for name, result in report["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if before and result["total_ms"] > before["total_ms"] * (1 + threshold):
+            regressions.append(f"{name}: {before['total_ms']:.2f} ms -> {result['total_ms']:.2f} ms")
+
+    for mode, levels in report["throughput"].items():
+        for workers, rate in levels.items():
+            before = baseline.get("throughput", {}).get(mode, {}).get(workers)
+            if before and rate < before * (1 - threshold):
+                regressions.append(f"{mode} x{workers}: {before:.2f} -> {rate:.2f} renders/s")
+    return regressions
+
+
+def main(argv=None) -> int:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(prog="python -m backend.bench", description="Benchmark the render pipeline.")
+    parser.add_argument("-o", "--output", type=Path, help="write the JSON report here")
+    parser.add_argument("--iterations", type=int, default=5, help="timed renders per case")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="highest worker count")
+    parser.add_argument("--renders", type=int, default=32, help="renders per throughput measurement")
+    parser.add_argument("--font", action="append", default=[], help="extra font file to benchmark")
+    parser.add_argument("--no-throughput", action="store_true", help="skip the throughput runs")
+    parser.add_argument("--baseline", type=Path, help="earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown as a fraction")
+    args = parser.parse_args(argv)
+
+    logger.setLevel(logging.WARNING)
+    report = run(args.iterations, args.max_workers, args.renders, args.font, not args.no_throughput)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""Build content-hashed, precompressed static assets.
+
+Usage:
+    python -m backend.build_assets
+
+Writes static/dist and its manifest.json. Run it whenever static files
+change; until then pages link to the plain /static URLs.
+"""
+
+import sys
+
+from backend.services.static_assets import brotli, build_assets
+
+
+def main(argv=None) -> int:
+    """Build the assets from the command line."""
+    manifest = build_assets()
+    for name, hashed in manifest.items():
+        print(f"{name} -> {hashed}")
+    if brotli is None:
+        print("brotli is not installed; only gzip variants were written", file=sys.stderr)
+    print(f"Built {len(manifest)} assets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,14 +4,17 @@ import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data"
 UPLOAD_DIR = BASE_DIR / "uploads"
 TEMPLATES_DIR = UPLOAD_DIR / "templates"
 FONTS_DIR = UPLOAD_DIR / "fonts"
+RESULT_CACHE_DIR = UPLOAD_DIR / "results"
+PREPARED_TEMPLATES_DIR = UPLOAD_DIR / "prepared"
+THUMBNAILS_DIR = UPLOAD_DIR / "thumbnails"
 DEFAULT_FONTS_DIR = BASE_DIR / "fonts"
-
-UPLOAD_DIR.mkdir(exist_ok=True)
-TEMPLATES_DIR.mkdir(exist_ok=True)
-FONTS_DIR.mkdir(exist_ok=True)
+STATIC_DIR = BASE_DIR / "static"
+ASSETS_DIR = STATIC_DIR / "dist"
+ASSET_MANIFEST_PATH = ASSETS_DIR / "manifest.json"
 
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024
 
@@ -27,6 +30,54 @@ DEFAULT_TEXT_Y_PERCENT = 0.745
 DEFAULT_FONT_SIZE_PERCENT = 0.04
 DEFAULT_TEXT_COLOR = (0, 0, 0, 255)
 
+OUTPUT_FORMATS = ("jpeg", "jpeg-progressive", "webp", "png", "avif")
+DEFAULT_OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "jpeg").lower()
+if DEFAULT_OUTPUT_FORMAT not in OUTPUT_FORMATS:
+    raise ValueError(f"OUTPUT_FORMAT must be one of {', '.join(OUTPUT_FORMATS)}, got {DEFAULT_OUTPUT_FORMAT!r}")
+DEFAULT_OUTPUT_QUALITY = int(os.environ.get("OUTPUT_QUALITY", 90))
+MIN_TARGET_QUALITY = 20
+PREVIEW_MAX_SIZE = int(os.environ.get("PREVIEW_MAX_SIZE", 480))
+
+THUMBNAIL_WIDTHS = (160, 320, 640)
+THUMBNAIL_FORMATS = ("webp", "jpeg")
+THUMBNAIL_QUALITY = 80
+GALLERY_PAGE_SIZE = 24
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MASK_SUPERSAMPLE = int(os.environ.get("MASK_SUPERSAMPLE", 1))
+
+TEMPLATE_CACHE_MAX_BYTES = int(os.environ.get("TEMPLATE_CACHE_MAX_MB", 256)) * 1024 * 1024
+FONT_CACHE_MAX_BYTES = int(os.environ.get("FONT_CACHE_MAX_MB", 64)) * 1024 * 1024
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 0))
+RENDER_QUEUE_SIZE = int(os.environ.get("RENDER_QUEUE_SIZE", 16))
+RENDER_RETRY_AFTER_SECONDS = int(os.environ.get("RENDER_RETRY_AFTER_SECONDS", 2))
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_MAX_CONCURRENT = int(os.environ.get("BATCH_MAX_CONCURRENT", 2))
+BATCH_ARCHIVE_MAX_BYTES = int(os.environ.get("BATCH_ARCHIVE_MAX_MB", 256)) * 1024 * 1024
+
+JOB_DB_PATH = DATA_DIR / "jobs.sqlite3"
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 64))
+JOB_CPU_SECONDS = int(os.environ.get("JOB_CPU_SECONDS", 20))
+JOB_CPU_GRACE_SECONDS = int(os.environ.get("JOB_CPU_GRACE_SECONDS", 5))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 3600))
+
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_MB", 128)) * 1024 * 1024
+RESULT_CACHE_DISK = os.environ.get("RESULT_CACHE_DISK", "False").lower() == "true"
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get("RESULT_CACHE_DISK_MAX_MB", 1024)) * 1024 * 1024
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL_HOURS", 24)) * 3600
+
+UPLOAD_DB_PATH = DATA_DIR / "uploads.sqlite3"
+UPLOAD_GC_GRACE_SECONDS = int(os.environ.get("UPLOAD_GC_GRACE_HOURS", 24)) * 3600
+
+SESSION_CACHE_MAX_BYTES = int(os.environ.get("SESSION_CACHE_MAX_MB", 256)) * 1024 * 1024
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", 1800))
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True").lower() == "true"
+METRICS_DIR = DATA_DIR / "metrics"
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 1))
+
 
 class Config:
     """Flask configuration class."""
@@ -1,125 +1,134 @@
 """Admin routes for configuration management."""
 
-import json
-import uuid
-from pathlib import Path
-from flask import Blueprint, request, jsonify, render_template
-
-from backend.config import BASE_DIR
+import sqlite3
+import threading
+from itertools import islice
+from flask import Blueprint, request, jsonify, render_template, url_for
+
+from backend.config import (
+    DATA_DIR,
+    DEFAULT_TEMPLATE_PATH,
+    GALLERY_PAGE_SIZE,
+    IMMUTABLE_CACHE_CONTROL,
+    THUMBNAIL_FORMATS,
+    THUMBNAIL_WIDTHS,
+)
+from backend.services.config_store import ConfigStore
+from backend.services.upload_store import config_references, get_upload_store
 from backend.utils import get_logger
 
 admin_bp = Blueprint("admin", __name__)
 logger = get_logger()
 
-CONFIG_DIR = BASE_DIR / "data"
+CONFIG_DIR = DATA_DIR
 CONFIG_FILE = CONFIG_DIR / "admin_config.json"
+CONFIG_DB = CONFIG_DIR / "configs.sqlite3"
 
+GALLERY_SORTS = {
+    "newest": (lambda item: item[1].get("created_at") or "", True),
+    "oldest": (lambda item: item[1].get("created_at") or "", False),
+    "name": (lambda item: gallery_name(item[1]).casefold(), False),
+}
 
-def ensure_config_dir():
-    """Ensure the configuration directory exists."""
-    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+_store = None
+_cache = (None, {}, None)
+_cache_lock = threading.Lock()
 
 
-def load_config(config_id=None):
-    """Load configuration from file."""
-    ensure_config_dir()
+def get_config_store() -> ConfigStore:
+    """Open the config store, migrating admin_config.json on first use."""
+    global _store
+    if _store is None:
+        _store = ConfigStore(CONFIG_DB, legacy_json_path=CONFIG_FILE)
+    return _store
 
-    if not CONFIG_FILE.exists():
-        return None
 
-    try:
-        with open(CONFIG_FILE, "r") as f:
-            data = json.load(f)
+def cached_configs():
+    """Return (configs, default) from memory, reloading only after a write.
 
-        if config_id:
-            configs = data.get("configs", {})
-            return configs.get(config_id)
-        else:
-            return data.get("default")
+    Every write, from any gunicorn worker, bumps the store's memory-mapped
+    version counter; while it is unchanged this is a memory read and no
+    database access. The returned dicts are shared and must not be modified.
+    """
+    global _cache
+    store = get_config_store()
+    version = store.version.get()
+    if _cache[0] != version:
+        with _cache_lock:
+            if _cache[0] != version:
+                configs = store.list_all()
+                _cache = (version, configs, configs.get(store.default_id()))
+    return _cache[1], _cache[2]
 
-    except (json.JSONDecodeError, IOError) as e:
+
+def load_config(config_id=None):
+    """Load a configuration by id, or the default configuration."""
+    try:
+        configs, default = cached_configs()
+    except sqlite3.Error as e:
         logger.error(f"Error loading config: {e}")
         return None
 
+    if config_id:
+        return configs.get(config_id)
+    return default
 
-def load_all_configs():
-    """Load all configurations from file."""
-    ensure_config_dir()
-
-    if not CONFIG_FILE.exists():
-        return {}
 
+def load_all_configs(limit=None, offset=0):
+    """Load saved configurations, optionally one page at a time."""
     try:
-        with open(CONFIG_FILE, "r") as f:
-            data = json.load(f)
-        return data.get("configs", {})
-    except (json.JSONDecodeError, IOError) as e:
+        configs, _ = cached_configs()
+    except sqlite3.Error as e:
         logger.error(f"Error loading configs: {e}")
         return {}
 
+    if limit is None:
+        return configs
+    return dict(islice(configs.items(), offset, offset + limit))
 
-def save_config(config, config_id=None):
-    """Save configuration to file."""
-    ensure_config_dir()
 
+def update_upload_references(added=None, removed=None):
+    """Count the uploads an added config uses and release those of a replaced or deleted one."""
     try:
-        data = {"configs": {}, "default": None}
-        if CONFIG_FILE.exists():
-            with open(CONFIG_FILE, "r") as f:
-                data = json.load(f)
-
-        if config_id and "configs" in data and config_id in data["configs"]:
-            existing = data["configs"][config_id]
-            if "created_at" not in config and "created_at" in existing:
-                config["created_at"] = existing["created_at"]
-            config["updated_at"] = __import__("datetime").datetime.now().isoformat()
-        elif not config_id:
-            config_id = uuid.uuid4().hex[:8]
-
-        if "configs" not in data:
-            data["configs"] = {}
+        store = get_upload_store()
+        store.retain(config_references(added))
+        store.release(config_references(removed))
+    except sqlite3.Error as e:
+        logger.error(f"Error updating upload references: {e}")
 
-        data["configs"][config_id] = config
-        data["default"] = config
 
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(data, f, indent=2)
-
-        return config_id
+def save_config(config, config_id=None):
+    """Save a configuration and return its id.
 
-    except IOError as e:
+    The config's uploads are retained before it is written, so they are
+    never unreferenced while it is live.
+    """
+    update_upload_references(added=config)
+    try:
+        store = get_config_store()
+        config_id, previous = store.save(config, config_id)
+    except sqlite3.Error as e:
         logger.error(f"Error saving config: {e}")
+        update_upload_references(removed=config)
         raise
 
+    update_upload_references(removed=previous)
+    return config_id
 
-def delete_config(config_id):
-    """Delete a configuration from file."""
-    ensure_config_dir()
-
-    if not CONFIG_FILE.exists():
-        return False
 
+def delete_config(config_id):
+    """Delete a configuration."""
     try:
-        with open(CONFIG_FILE, "r") as f:
-            data = json.load(f)
-
-        if "configs" in data and config_id in data["configs"]:
-            del data["configs"][config_id]
-
-            if data.get("default") and data["configs"]:
-                data["default"] = list(data["configs"].values())[-1]
-            elif not data["configs"]:
-                data["default"] = None
-
-            with open(CONFIG_FILE, "w") as f:
-                json.dump(data, f, indent=2)
-
-            return True
+        store = get_config_store()
+        previous = store.delete(config_id)
+    except sqlite3.Error as e:
+        logger.error(f"Error deleting config: {e}")
         return False
 
-    except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"Error deleting config: {e}")
+    if previous is None:
         return False
+    update_upload_references(removed=previous)
+    return True
 
 
 @admin_bp.route("/")
@@ -187,14 +196,116 @@ def api_get_config():
 def api_list_configs():
     """List all saved configurations."""
     try:
-        configs = load_all_configs()
-        return jsonify({"configs": configs})
+        if "limit" not in request.args and "offset" not in request.args:
+            return jsonify({"configs": load_all_configs()})
+
+        limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        configs = load_all_configs(limit, offset)
+        return jsonify({
+            "configs": configs,
+            "total": len(cached_configs()[0]),
+            "limit": limit,
+            "offset": offset,
+        })
 
     except Exception as e:
         logger.error(f"Failed to list configurations: {e}", exc_info=True)
         return jsonify({"error": "Failed to list configurations"}), 500
 
 
+def gallery_name(config: dict) -> str:
+    """Return the name a template is listed under in the gallery."""
+    return config.get("template_name") or config.get("conference_name") or "Untitled"
+
+
+def thumbnail_urls(config: dict) -> dict:
+    """Return {format: {width: url}} for the thumbnails of a config's template."""
+    template_id = "default"
+    params = {"v": DEFAULT_TEMPLATE_PATH.stat().st_mtime_ns}
+    if config.get("template_id"):
+        path = get_upload_store().path("template", config["template_id"])
+        if path is not None:
+            template_id, params = path.name, {}
+
+    return {
+        output_format: {
+            str(width): url_for(
+                "api.serve_thumbnail", template_id=template_id, name=f"{width}.{output_format}", **params
+            )
+            for width in THUMBNAIL_WIDTHS
+        }
+        for output_format in THUMBNAIL_FORMATS
+    }
+
+
+@admin_bp.route("/api/gallery", methods=["GET"])
+def api_gallery():
+    """List saved templates one sorted page at a time, with thumbnail URLs.
+
+    Accepts page, per_page, sort (newest, oldest or name) and q, a search on
+    the template name. The response includes a version that changes with
+    every config write; pages requested with a matching v are immutable.
+    """
+    try:
+        sort = request.args.get("sort", "newest")
+        if sort not in GALLERY_SORTS:
+            return jsonify({"error": f"sort must be one of: {', '.join(GALLERY_SORTS)}"}), 400
+
+        page = max(request.args.get("page", 1, type=int), 1)
+        per_page = min(max(request.args.get("per_page", GALLERY_PAGE_SIZE, type=int), 1), 100)
+        query = request.args.get("q", "").strip().casefold()
+
+        version = f"{get_config_store().version.get()}-{DEFAULT_TEMPLATE_PATH.stat().st_mtime_ns}"
+        configs, _ = cached_configs()
+        items = [
+            item for item in configs.items()
+            if not query or query in gallery_name(item[1]).casefold()
+            or query in (item[1].get("conference_name") or "").casefold()
+        ]
+        key, reverse = GALLERY_SORTS[sort]
+        items.sort(key=key, reverse=reverse)
+
+        total = len(items)
+        start = (page - 1) * per_page
+        page_items = [
+            {
+                "config_id": config_id,
+                "name": gallery_name(config),
+                "created_at": config.get("created_at"),
+                "thumbnails": thumbnail_urls(config),
+                "config": config,
+            }
+            for config_id, config in items[start:start + per_page]
+        ]
+
+        next_url = None
+        if start + per_page < total:
+            next_url = url_for(
+                "admin.api_gallery", page=page + 1, per_page=per_page, sort=sort,
+                q=request.args.get("q") or None, v=version,
+            )
+
+        response = jsonify({
+            "items": page_items,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "version": version,
+            "next": next_url,
+        })
+        if request.args.get("v") == version:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        response.set_etag(f"gallery-{version}")
+        return response.make_conditional(request)
+
+    except Exception as e:
+        logger.error(f"Failed to list gallery: {e}", exc_info=True)
+        return jsonify({"error": "Failed to list templates"}), 500
+
+
 @admin_bp.route("/api/delete-config", methods=["DELETE"])
 def api_delete_config():
     """Delete a configuration."""
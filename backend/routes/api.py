@@ -1,97 +1,406 @@
 """API routes for image processing and file uploads."""
 
-import uuid
+import io
+import threading
+import time
+import zipfile
 from pathlib import Path
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    g,
+    request,
+    jsonify,
+    send_file,
+    send_from_directory,
+    stream_with_context,
+    url_for,
+)
+from PIL import Image
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 
-from backend.config import TEMPLATES_DIR, FONTS_DIR, DEFAULT_FONT_PATH, DEFAULT_TEMPLATE_PATH
-from backend.services import ImageProcessor
+from backend.batch import load_manifest, render_rows, stream_results_zip, zip_photo_loader
+from backend.config import (
+    BATCH_MAX_CONCURRENT,
+    TEMPLATES_DIR,
+    FONTS_DIR,
+    DEFAULT_FONT_PATH,
+    DEFAULT_TEMPLATE_PATH,
+    IMMUTABLE_CACHE_CONTROL,
+    RENDER_RETRY_AFTER_SECONDS,
+    SESSION_TTL_SECONDS,
+)
+from backend.services import ImageProcessor, RenderSpec, to_data_url
+from backend.services.encoders import ENCODERS, encoder_for_data, get_encoder
+from backend.services.job_queue import JOB_DONE, JOB_QUEUED, get_job_queue
+from backend.services.metrics import observe, observe_stages
+from backend.services.photo_sessions import PhotoSessionExpired, photo_sessions
+from backend.services.render_pool import RenderPoolFull, get_batch_pool, get_render_pool
+from backend.services.result_cache import result_cache, result_key
+from backend.services.template_store import load_sidecar, prepare_template
+from backend.services.thumbnails import create_thumbnails, get_thumbnail
+from backend.services.upload_store import get_upload_store
 from backend.utils import get_logger, validate_image_file, validate_font_file, validate_position_params
-from backend.utils.validators import ValidationError
+from backend.utils.timing import StageTimer
+from backend.utils.validators import (
+    OUTPUT_PARAM_KEYS,
+    POSITION_PARAM_KEYS,
+    ValidationError,
+    resolve_upload_path,
+    validate_output_params,
+)
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 logger = get_logger()
 
 _default_processor = None
 
+_batch_slots = threading.BoundedSemaphore(BATCH_MAX_CONCURRENT)
+
+
+@api_bp.before_request
+def start_request_timer():
+    """Note when the request started for the request duration histogram."""
+    g.request_started = time.perf_counter()
+
+
+@api_bp.after_request
+def record_request_time(response):
+    """Record how long the request took, by endpoint and status code."""
+    elapsed = time.perf_counter() - g.request_started
+    observe("dp_request_seconds", elapsed, endpoint=request.endpoint, status=response.status_code)
+    return response
+
 
 def get_processor():
-    """Get or create the default image processor."""
+    """Get or create the shared image processor used for stateless renders."""
     global _default_processor
     if _default_processor is None:
         _default_processor = ImageProcessor()
     return _default_processor
 
 
+def wants_binary_response() -> bool:
+    """Check whether the client asked for raw image bytes instead of JSON."""
+    if request.args.get("format") == "binary":
+        return True
+    offered = ["application/json"] + sorted({encoder.mimetype for encoder in ENCODERS.values()})
+    best = request.accept_mimetypes.best_match(offered)
+    return best is not None and best.startswith("image/")
+
+
+class InvalidResourceId(ValidationError):
+    """Raised when a template or font id points outside its upload directory."""
+    pass
+
+
+def build_render_spec(form) -> RenderSpec:
+    """Validate render form fields and resolve template and font ids into a spec."""
+    username = form.get("username", "").strip()
+
+    position_params = {}
+    for key in POSITION_PARAM_KEYS:
+        if key in form:
+            position_params[key] = form[key]
+
+    validated_params = validate_position_params(position_params)
+    validated_params.update(validate_output_params({key: form[key] for key in OUTPUT_PARAM_KEYS if key in form}))
+
+    template_id = form.get("template_id")
+    font_id = form.get("font_id")
+
+    template_path = DEFAULT_TEMPLATE_PATH
+    if template_id:
+        custom_path = resolve_upload_path(TEMPLATES_DIR, template_id)
+        if custom_path is None:
+            logger.warning(f"Path traversal attempt in template_id: {template_id}")
+            raise InvalidResourceId("Invalid template ID")
+
+        stored_path = get_upload_store().path("template", template_id)
+        if stored_path is not None:
+            template_path = stored_path
+            logger.info("Using custom template: %s", template_id)
+        else:
+            logger.warning(f"Custom template not found: {template_id}")
+
+    font_path = DEFAULT_FONT_PATH
+    if font_id:
+        custom_path = resolve_upload_path(FONTS_DIR, font_id)
+        if custom_path is None:
+            logger.warning(f"Path traversal attempt in font_id: {font_id}")
+            raise InvalidResourceId("Invalid font ID")
+
+        stored_path = get_upload_store().path("font", font_id)
+        if stored_path is not None:
+            font_path = stored_path
+            logger.info("Using custom font: %s", font_id)
+        else:
+            logger.warning(f"Custom font not found: {font_id}")
+
+    return RenderSpec(
+        username=username,
+        template_path=template_path,
+        font_path=font_path,
+        **validated_params,
+    )
+
+
+def session_photo(photo_token: str, spec: RenderSpec):
+    """Return the session's decoded photo at the diameter spec renders at."""
+    return photo_sessions.get_photo(photo_token, get_processor().photo_diameter(spec))
+
+
+def busy_response():
+    """Build the 503 returned when the render queue is full."""
+    response = jsonify({"error": "Server is busy. Please try again shortly."})
+    response.headers["Retry-After"] = str(RENDER_RETRY_AFTER_SECONDS)
+    return response, 503
+
+
 @api_bp.route("/process-image", methods=["POST"])
 def process_image():
     """Process an uploaded image and generate a display picture."""
+    timer = StageTimer()
     try:
-        if "image" not in request.files:
+        with timer.stage("upload_read"):
+            has_image = "image" in request.files
+        photo_token = request.form.get("photo_token")
+        if not has_image and not photo_token:
             logger.warning("Process request missing image file")
             return jsonify({"error": "No image provided"}), 400
 
-        image_file = request.files["image"]
-        validate_image_file(image_file)
+        with timer.stage("validation"):
+            if has_image:
+                validate_image_file(request.files["image"])
+            spec = build_render_spec(request.form)
+        username = spec.username
 
-        username = request.form.get("username", "").strip()
+        if has_image:
+            image_data = request.files["image"].stream
+            cache_key = result_key(spec, image_data)
+        else:
+            image_data = session_photo(photo_token, spec)
+            cache_key = result_key(spec, photo_digest=bytes.fromhex(photo_token))
+
+        if cache_key in request.if_none_match:
+            response = current_app.response_class(status=304)
+            response.set_etag(cache_key)
+            response.vary.add("Accept")
+            return response
+
+        buffer = result_cache.get(cache_key)
+        if buffer is not None:
+            logger.info("Serving cached result for: %s", username)
+        else:
+            pool = get_render_pool()
+            if pool is not None:
+                if has_image:
+                    with timer.stage("upload_read"):
+                        image_data = image_data.read()
+                buffer = pool.render_to_buffer(spec, image_data)
+            else:
+                buffer = get_processor().render_to_buffer(spec, image_data)
+            result_cache.put(cache_key, buffer)
+
+        encoder = get_encoder(spec.output_format)
+        with timer.stage("serialize"):
+            if wants_binary_response():
+                response = send_file(buffer, mimetype=encoder.mimetype, download_name=f"dp{encoder.extension}")
+            else:
+                response = jsonify({"image": to_data_url(buffer, encoder.mimetype)})
+        response.set_etag(cache_key)
+        response.vary.add("Accept")
+        return response
+
+    except InvalidResourceId as e:
+        return jsonify({"error": str(e)}), 400
+    except PhotoSessionExpired as e:
+        return jsonify({"error": str(e)}), 404
+    except ValidationError as e:
+        logger.warning(f"Validation error: {e}")
+        return jsonify({"error": "Invalid input provided"}), 400
+    except RenderPoolFull:
+        logger.warning("Render queue full, rejecting request")
+        return busy_response()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Image processing failed: {e}", exc_info=True)
+        return jsonify({"error": "Failed to process image. Please try again."}), 500
+    finally:
+        observe_stages(timer)
 
-        position_params = {}
-        for key in ["image_x", "image_y", "image_size", "image_shape", "text_x", "text_y", "font_size", "text_color"]:
-            if key in request.form:
-                position_params[key] = request.form[key]
 
-        validated_params = validate_position_params(position_params)
+@api_bp.route("/photo-sessions", methods=["POST"])
+def create_photo_session():
+    """Store an uploaded photo so later renders can refer to it by token.
 
-        template_id = request.form.get("template_id")
-        font_id = request.form.get("font_id")
+    Accepts the same form fields as /process-image; the photo is decoded
+    up front at the diameter they describe.
+    """
+    try:
+        if "image" not in request.files:
+            logger.warning("Photo session request missing image file")
+            return jsonify({"error": "No image provided"}), 400
 
-        processor = get_processor()
+        image_file = request.files["image"]
+        validate_image_file(image_file)
+        spec = build_render_spec(request.form)
 
-        if template_id:
-            template_path = TEMPLATES_DIR / secure_filename(template_id)
-            template_path = template_path.resolve()
+        try:
+            token = photo_sessions.create(image_file.read(), get_processor().photo_diameter(spec))
+        except (OSError, ValueError) as e:
+            raise ValidationError(f"Photo could not be decoded: {e}")
 
-            if not str(template_path).startswith(str(TEMPLATES_DIR.resolve())):
-                logger.warning(f"Path traversal attempt in template_id: {template_id}")
-                return jsonify({"error": "Invalid template ID"}), 400
+        return jsonify({"photo_token": token, "expires_in": SESSION_TTL_SECONDS}), 201
 
-            if template_path.exists():
-                processor.set_template(template_path)
-                logger.info(f"Using custom template: {template_id}")
-            else:
-                logger.warning(f"Custom template not found: {template_id}")
-        else:
-            processor.set_template(DEFAULT_TEMPLATE_PATH)
+    except InvalidResourceId as e:
+        return jsonify({"error": str(e)}), 400
+    except ValidationError as e:
+        logger.warning(f"Validation error: {e}")
+        return jsonify({"error": "Invalid input provided"}), 400
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Photo session creation failed: {e}", exc_info=True)
+        return jsonify({"error": "Failed to store photo. Please try again."}), 500
 
-        if font_id:
-            font_path = FONTS_DIR / secure_filename(font_id)
-            font_path = font_path.resolve()
 
-            if not str(font_path).startswith(str(FONTS_DIR.resolve())):
-                logger.warning(f"Path traversal attempt in font_id: {font_id}")
-                return jsonify({"error": "Invalid font ID"}), 400
+@api_bp.route("/jobs", methods=["POST"])
+def create_job():
+    """Queue a render and return its job id without waiting for the result."""
+    try:
+        photo_token = request.form.get("photo_token")
+        if "image" not in request.files and not photo_token:
+            logger.warning("Job request missing image file")
+            return jsonify({"error": "No image provided"}), 400
 
-            if font_path.exists():
-                processor.set_font(font_path)
-                logger.info(f"Using custom font: {font_id}")
-            else:
-                logger.warning(f"Custom font not found: {font_id}")
+        if "image" in request.files:
+            image_file = request.files["image"]
+            validate_image_file(image_file)
+            spec = build_render_spec(request.form)
+            image_data = image_file.read()
         else:
-            processor.set_font(DEFAULT_FONT_PATH)
+            spec = build_render_spec(request.form)
+            image_data = session_photo(photo_token, spec)
 
-        image_data = image_file.read()
-        result = processor.process(image_data=image_data, username=username, **validated_params)
+        job_id = get_job_queue().submit(spec, image_data)
 
-        return jsonify({"image": result})
+        return jsonify({
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "status_url": url_for("api.get_job", job_id=job_id),
+        }), 202
 
+    except InvalidResourceId as e:
+        return jsonify({"error": str(e)}), 400
+    except PhotoSessionExpired as e:
+        return jsonify({"error": str(e)}), 404
     except ValidationError as e:
         logger.warning(f"Validation error: {e}")
         return jsonify({"error": "Invalid input provided"}), 400
+    except RenderPoolFull:
+        logger.warning("Job queue full, rejecting request")
+        return busy_response()
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Image processing failed: {e}", exc_info=True)
-        return jsonify({"error": "Failed to process image. Please try again."}), 500
+        logger.error(f"Job creation failed: {e}", exc_info=True)
+        return jsonify({"error": "Failed to queue image. Please try again."}), 500
+
+
+@api_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Return the status of a job, or its image once it is done."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    if job["status"] == JOB_DONE:
+        buffer = io.BytesIO(job["result"])
+        encoder = encoder_for_data(job["result"])
+        if wants_binary_response():
+            response = send_file(buffer, mimetype=encoder.mimetype, download_name=f"dp{encoder.extension}")
+        else:
+            response = jsonify({"job_id": job_id, "status": JOB_DONE, "image": to_data_url(buffer, encoder.mimetype)})
+        response.vary.add("Accept")
+        return response
+
+    body = {"job_id": job_id, "status": job["status"]}
+    if job["error"]:
+        body["error"] = job["error"]
+    return jsonify(body)
+
+
+@api_bp.route("/batch", methods=["POST"])
+def batch_generate():
+    """Render a roster of photos and stream back a zip of results."""
+    if not _batch_slots.acquire(blocking=False):
+        logger.warning("Too many batches running, rejecting request")
+        return busy_response()
+
+    streaming = False
+    try:
+        manifest_file = request.files.get("manifest")
+        if not manifest_file:
+            return jsonify({"error": "No manifest provided"}), 400
+
+        rows = load_manifest(manifest_file.stream, manifest_file.filename or "")
+        if not rows:
+            return jsonify({"error": "Manifest is empty"}), 400
+
+        # Uploaded files are closed when the request ends, before the response
+        # finishes streaming, so take the (MAX_CONTENT_LENGTH-bounded) bytes now.
+        archive_file = request.files.get("archive")
+        if archive_file:
+            load_photo = zip_photo_loader(io.BytesIO(archive_file.read()))
+        else:
+            photos = {}
+            for photo in request.files.getlist("photos"):
+                if not photo.filename:
+                    continue
+                try:
+                    validate_image_file(photo)
+                    photos[Path(photo.filename).name] = photo.read()
+                except ValidationError as e:
+                    photos[Path(photo.filename).name] = e
+            if not photos:
+                return jsonify({"error": "No photos provided"}), 400
+
+            def load_photo(name):
+                photo = photos[Path(name).name]
+                if isinstance(photo, ValidationError):
+                    raise photo
+                return photo
+
+        defaults = {
+            key: request.form[key]
+            for key in ["template_id", "font_id", *POSITION_PARAM_KEYS, *OUTPUT_PARAM_KEYS]
+            if key in request.form
+        }
+
+        logger.info(f"Batch started: {len(rows)} items")
+        results = render_rows(rows, load_photo, defaults, pool=get_batch_pool())
+        response = Response(stream_with_context(stream_results_zip(results)), mimetype="application/zip")
+        response.headers["Content-Disposition"] = 'attachment; filename="dps.zip"'
+        response.call_on_close(_batch_slots.release)
+        streaming = True
+        return response
+
+    except (ValidationError, ValueError, zipfile.BadZipFile) as e:
+        logger.warning(f"Batch validation error: {e}")
+        return jsonify({"error": "Invalid batch input provided"}), 400
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch generation failed: {e}", exc_info=True)
+        return jsonify({"error": "Failed to process batch"}), 500
+    finally:
+        if not streaming:
+            _batch_slots.release()
 
 
 @api_bp.route("/upload-template", methods=["POST"])
@@ -106,17 +415,33 @@ def upload_template():
 
         original_name = secure_filename(template_file.filename)
         ext = Path(original_name).suffix
-        template_id = f"{uuid.uuid4().hex}{ext}"
-
+        template_id, created = get_upload_store().store("template", template_file.stream, ext)
         save_path = TEMPLATES_DIR / template_id
-        template_file.save(save_path)
+
+        try:
+            sidecar = (None if created else load_sidecar(save_path)) or prepare_template(save_path)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            if created:
+                get_upload_store().remove("template", template_id)
+            raise ValidationError(f"Template could not be decoded: {e}")
+
+        try:
+            create_thumbnails(save_path)
+        except OSError as e:
+            logger.error(f"Thumbnail generation failed for {template_id}: {e}")
 
         logger.info(f"Template uploaded: {template_id}")
-        return jsonify({"template_id": template_id, "message": "Template uploaded successfully"})
+        return jsonify({
+            "template_id": template_id,
+            "plan": sidecar["plan"],
+            "message": "Template uploaded successfully",
+        })
 
     except ValidationError as e:
         logger.warning(f"Validation error: {e}")
         return jsonify({"error": "Invalid file provided"}), 400
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Template upload failed: {e}", exc_info=True)
         return jsonify({"error": "Failed to upload template"}), 500
@@ -134,10 +459,7 @@ def upload_font():
 
         original_name = secure_filename(font_file.filename)
         ext = Path(original_name).suffix
-        font_id = f"{uuid.uuid4().hex}{ext}"
-
-        save_path = FONTS_DIR / font_id
-        font_file.save(save_path)
+        font_id, _ = get_upload_store().store("font", font_file.stream, ext)
 
         logger.info(f"Font uploaded: {font_id}")
         return jsonify({"font_id": font_id, "message": "Font uploaded successfully"})
@@ -145,6 +467,8 @@ def upload_font():
     except ValidationError as e:
         logger.warning(f"Validation error: {e}")
         return jsonify({"error": "Invalid file provided"}), 400
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Font upload failed: {e}", exc_info=True)
         return jsonify({"error": "Failed to upload font"}), 500
@@ -158,11 +482,43 @@ def legacy_process_image():
 
 @api_bp.route("/uploads/templates/<path:filename>")
 def serve_template(filename):
-    """Serve uploaded template files."""
-    return send_from_directory(TEMPLATES_DIR, filename)
+    """Serve uploaded template files, including by alias."""
+    path = get_upload_store().path("template", filename)
+    if path is None:
+        abort(404)
+    return send_from_directory(TEMPLATES_DIR, path.name)
+
+
+@api_bp.route("/uploads/thumbnails/<template_id>/<name>")
+def serve_thumbnail(template_id, name):
+    """Serve a template thumbnail such as 320.webp, creating it on first request.
+
+    Upload ids never change content, so thumbnails are cached as immutable;
+    the default template's URL carries its modification time instead.
+    """
+    width, _, output_format = name.partition(".")
+    output_format = "jpeg" if output_format == "jpg" else output_format
+    if template_id == "default":
+        source = DEFAULT_TEMPLATE_PATH
+    else:
+        source = get_upload_store().path("template", template_id)
+    if source is None or not width.isdigit():
+        abort(404)
+
+    try:
+        path = get_thumbnail(source, int(width), output_format)
+    except ValueError:
+        abort(404)
+
+    response = send_file(path, mimetype=ENCODERS[output_format].mimetype, conditional=True)
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
 
 
 @api_bp.route("/uploads/fonts/<path:filename>")
 def serve_font(filename):
-    """Serve uploaded font files."""
-    return send_from_directory(FONTS_DIR, filename)
+    """Serve uploaded font files, including by alias."""
+    path = get_upload_store().path("font", filename)
+    if path is None:
+        abort(404)
+    return send_from_directory(FONTS_DIR, path.name)
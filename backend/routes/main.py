@@ -1,8 +1,27 @@
 """Main routes for serving the frontend."""
 
-from flask import Blueprint, render_template
+import os
+import threading
+import time
+from pathlib import Path
+from flask import Blueprint, Response, abort, jsonify, render_template, request, send_file
+from werkzeug.security import safe_join
+
+from backend.config import ASSETS_DIR, IMMUTABLE_CACHE_CONTROL
+from backend.routes.admin import load_config
+from backend.routes.api import build_render_spec, get_processor
+from backend.services import RenderSpec
+from backend.services.metrics import observe, render_metrics
+from backend.services.static_assets import choose_variant
+from backend.utils import get_logger
+from backend.utils.timing import startup_timer
+from backend.utils.validators import ValidationError
 
 main_bp = Blueprint("main", __name__)
+logger = get_logger()
+
+_warmed_spec = None
+_warm_up_lock = threading.Lock()
 
 
 @main_bp.route("/generate-dp")
@@ -15,3 +34,70 @@ def generate_dp():
 def index():
     """Legacy route for the main application page."""
     return render_template("index.html")
+
+
+@main_bp.route("/metrics")
+def metrics():
+    """Expose render timings, cache counters and queue depths for Prometheus."""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@main_bp.route("/assets/<path:filename>")
+def serve_asset(filename):
+    """Serve a content-hashed static asset in the smallest variant the client accepts."""
+    path = safe_join(str(ASSETS_DIR), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    variant, mimetype, encoding = choose_variant(Path(path), request.accept_encodings, request.accept_mimetypes)
+    response = send_file(variant, mimetype=mimetype, conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.update(("Accept", "Accept-Encoding"))
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def active_render_spec() -> RenderSpec:
+    """Build the spec renders of the active (default) config start from."""
+    config = load_config()
+    if not config:
+        return RenderSpec()
+    try:
+        return build_render_spec(config)
+    except ValidationError as e:
+        logger.warning(f"Active config is not renderable, warming defaults: {e}")
+        return RenderSpec()
+
+
+@main_bp.route("/readyz")
+def readiness():
+    """Preload the active config's template and font, then report readiness.
+
+    Point the platform's startup or readiness probe here. The first call
+    does the loading; later calls return at once until the active config
+    changes.
+    """
+    global _warmed_spec
+    try:
+        spec = active_render_spec()
+        if spec != _warmed_spec:
+            with _warm_up_lock:
+                if spec != _warmed_spec:
+                    started = time.perf_counter()
+                    get_processor().warm_up(spec)
+                    elapsed = time.perf_counter() - started
+                    startup_timer.record("warm_up", elapsed)
+                    observe("dp_startup_seconds", elapsed, phase="warm_up")
+                    logger.info("Warmed up %s in %.0f ms", spec.template_path.name, elapsed * 1000)
+                    _warmed_spec = spec
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}", exc_info=True)
+        return jsonify({"status": "unavailable", "error": "Warm-up failed"}), 503
+
+    return jsonify({
+        "status": "ready",
+        "template": spec.template_path.name,
+        "font": spec.font_path.name,
+        "startup_seconds": startup_timer.stages,
+    })
@@ -1,5 +1,5 @@
 """Services package initialization."""
 
-from .image_processor import ImageProcessor
+from .image_processor import ImageProcessor, RenderSpec, to_data_url
 
-__all__ = ["ImageProcessor"]
+__all__ = ["ImageProcessor", "RenderSpec", "to_data_url"]
@@ -0,0 +1,217 @@
+"""SQLite storage for admin template configurations."""
+
+import fcntl
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from backend.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class SharedVersion:
+    """A 64-bit counter in a memory-mapped file, visible to every process.
+
+    Reading it is a plain memory access, so callers can poll it on every
+    request to notice writes made by other gunicorn workers.
+    """
+
+    def __init__(self, path: Path):
+        """Map the counter file, creating it if needed."""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            self._map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+        self.path = path
+
+    def get(self) -> int:
+        """Return the current counter value."""
+        return struct.unpack_from("<Q", self._map, 0)[0]
+
+    def bump(self) -> None:
+        """Increment the counter, serialized across processes by a file lock."""
+        with open(self.path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                struct.pack_into("<Q", self._map, 0, self.get() + 1)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ConfigStore:
+    """Indexed, transactional store of configs keyed by config_id.
+
+    Configs keep the order in which they were first saved, and the store
+    tracks a "default" config: the one most recently saved. Every committed
+    write bumps the shared version counter.
+    """
+
+    def __init__(self, db_path: Path, legacy_json_path: Path = None):
+        """Open the store, creating tables and migrating the legacy JSON file once."""
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._read() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS configs ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        self.version = SharedVersion(db_path.with_suffix(".version"))
+
+        if legacy_json_path is not None:
+            self._migrate_json(legacy_json_path)
+
+    @contextmanager
+    def _transaction(self):
+        """Run a write transaction that holds the database write lock throughout."""
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _read(self):
+        """Open a connection for reads."""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _migrate_json(self, json_path: Path) -> None:
+        """Import configs from the old admin_config.json file the first time."""
+        if not json_path.exists():
+            return
+
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                return
+
+            try:
+                with open(json_path, "r") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.error(f"Could not migrate {json_path}: {e}")
+                return
+
+            configs = data.get("configs", {})
+            default = data.get("default")
+            default_id = None
+            for config_id, config in configs.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO configs (id, data) VALUES (?, ?)",
+                    (config_id, json.dumps(config)),
+                )
+                if config == default:
+                    default_id = config_id
+
+            if default is not None and default_id is None and configs:
+                default_id = list(configs)[-1]
+
+            self._set_default(conn, default_id)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_json', ?)", (str(json_path),))
+
+        self.version.bump()
+        logger.info(f"Migrated {len(configs)} configs from {json_path}")
+
+    def _set_default(self, conn: sqlite3.Connection, config_id) -> None:
+        """Point the default config at config_id, or clear it."""
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('default_id', ?)", (config_id,))
+
+    def get(self, config_id: str = None):
+        """Return a config by id, or the default config when config_id is None."""
+        with self._read() as conn:
+            if config_id:
+                row = conn.execute("SELECT data FROM configs WHERE id = ?", (config_id,)).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT data FROM configs WHERE id = (SELECT value FROM meta WHERE key = 'default_id')"
+                ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def default_id(self):
+        """Return the id of the default config, or None."""
+        with self._read() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'default_id'").fetchone()
+        return row[0] if row else None
+
+    def list_all(self, limit: int = None, offset: int = 0) -> dict:
+        """Return configs keyed by id in the order they were first saved."""
+        query = "SELECT id, data FROM configs ORDER BY seq"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params = (limit, offset)
+
+        with self._read() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        return {config_id: json.loads(data) for config_id, data in rows}
+
+    def save(self, config: dict, config_id: str = None) -> tuple:
+        """Insert or update a config and make it the default.
+
+        Returns (config_id, replaced config or None); the replaced config is
+        read in the same transaction as the write.
+        """
+        with self._transaction() as conn:
+            existing = None
+            if config_id:
+                row = conn.execute("SELECT data FROM configs WHERE id = ?", (config_id,)).fetchone()
+                existing = json.loads(row[0]) if row else None
+            else:
+                config_id = uuid.uuid4().hex[:8]
+
+            if existing is not None:
+                if "created_at" not in config and "created_at" in existing:
+                    config["created_at"] = existing["created_at"]
+                config["updated_at"] = datetime.now().isoformat()
+                conn.execute("UPDATE configs SET data = ? WHERE id = ?", (json.dumps(config), config_id))
+            else:
+                conn.execute("INSERT INTO configs (id, data) VALUES (?, ?)", (config_id, json.dumps(config)))
+
+            self._set_default(conn, config_id)
+
+        self.version.bump()
+        return config_id, existing
+
+    def delete(self, config_id: str):
+        """Delete a config and return it, or None if there was no such config.
+
+        The latest remaining config becomes the default.
+        """
+        with self._transaction() as conn:
+            deleted = conn.execute("SELECT data FROM configs WHERE id = ?", (config_id,)).fetchone()
+            if deleted is None:
+                return None
+            conn.execute("DELETE FROM configs WHERE id = ?", (config_id,))
+
+            row = conn.execute("SELECT value FROM meta WHERE key = 'default_id'").fetchone()
+            if row and row[0] is not None:
+                last = conn.execute("SELECT id FROM configs ORDER BY seq DESC LIMIT 1").fetchone()
+                self._set_default(conn, last[0] if last else None)
+
+        self.version.bump()
+        return json.loads(deleted[0])
@@ -0,0 +1,91 @@
+"""Output encoders for rendered display pictures."""
+
+import io
+import time
+from dataclasses import dataclass, field
+from PIL import Image
+
+from backend.config import DEFAULT_OUTPUT_FORMAT, DEFAULT_OUTPUT_QUALITY, MIN_TARGET_QUALITY
+from backend.services.metrics import observe
+from backend.utils.logger import get_logger
+
+logger = get_logger()
+
+
+@dataclass(frozen=True)
+class Encoder:
+    """How to save a rendered image in one output format."""
+    name: str
+    pil_format: str
+    mimetype: str
+    extension: str
+    lossy: bool = True
+    options: dict = field(default_factory=dict)
+
+    def save(self, image: Image.Image, quality: int) -> io.BytesIO:
+        """Encode image at the given quality into a buffer positioned at the start."""
+        buffer = io.BytesIO()
+        if self.lossy:
+            image.save(buffer, self.pil_format, quality=quality, **self.options)
+        else:
+            image.save(buffer, self.pil_format, **self.options)
+        buffer.seek(0)
+        return buffer
+
+
+ENCODERS = {
+    "jpeg": Encoder("jpeg", "JPEG", "image/jpeg", ".jpg", options={"optimize": False}),
+    "jpeg-progressive": Encoder(
+        "jpeg-progressive", "JPEG", "image/jpeg", ".jpg", options={"progressive": True, "optimize": True}
+    ),
+    "webp": Encoder("webp", "WEBP", "image/webp", ".webp", options={"method": 4}),
+    "png": Encoder("png", "PNG", "image/png", ".png", lossy=False, options={"compress_level": 6}),
+    "avif": Encoder("avif", "AVIF", "image/avif", ".avif", options={"speed": 8}),
+}
+
+
+def get_encoder(output_format: str = None) -> Encoder:
+    """Return the encoder for a format name, or the default encoder."""
+    return ENCODERS[output_format or DEFAULT_OUTPUT_FORMAT]
+
+
+def encode(image: Image.Image, output_format: str = None, quality: int = None, target_kb: int = None) -> io.BytesIO:
+    """Encode an RGB image, optionally searching for the best quality under target_kb.
+
+    With target_kb, lossy formats binary-search quality between
+    MIN_TARGET_QUALITY and the requested quality for the largest output that
+    fits. If nothing fits, the lowest quality tried is returned. Lossless
+    formats ignore the target.
+    """
+    encoder = get_encoder(output_format)
+    quality = quality or DEFAULT_OUTPUT_QUALITY
+    start = time.perf_counter()
+
+    buffer = encoder.save(image, quality)
+    if target_kb and encoder.lossy and buffer.getbuffer().nbytes > target_kb * 1024:
+        target_bytes = target_kb * 1024
+        low, high = MIN_TARGET_QUALITY, quality - 1
+        best, smallest = None, buffer
+        while low <= high:
+            attempt = (low + high) // 2
+            candidate = encoder.save(image, attempt)
+            if candidate.getbuffer().nbytes <= target_bytes:
+                best, low = candidate, attempt + 1
+            else:
+                smallest, high = candidate, attempt - 1
+        buffer = best or smallest
+
+    observe("dp_encode_seconds", time.perf_counter() - start, format=encoder.name)
+    return buffer
+
+
+def encoder_for_data(data) -> Encoder:
+    """Identify which encoder produced already-encoded image bytes."""
+    header = bytes(data[:12])
+    if header.startswith(b"\x89PNG"):
+        return ENCODERS["png"]
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ENCODERS["webp"]
+    if header[4:12] in (b"ftypavif", b"ftypavis"):
+        return ENCODERS["avif"]
+    return ENCODERS["jpeg"]
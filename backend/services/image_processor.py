@@ -3,9 +3,9 @@
 import io
 import base64
 import textwrap
+from dataclasses import dataclass
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-from pillow_heif import register_heif_opener
+from PIL import Image, ImageOps
 
 from backend.config import (
     DEFAULT_TEMPLATE_PATH,
@@ -15,16 +15,58 @@ from backend.config import (
     DEFAULT_TEXT_Y_PERCENT,
     DEFAULT_FONT_SIZE_PERCENT,
     DEFAULT_TEXT_COLOR,
+    PREVIEW_MAX_SIZE,
 )
+from backend.services.encoders import encode, get_encoder
+from backend.services.layout_cache import get_circular_mask, get_glyph_atlas
+from backend.services.metrics import observe_stages
+from backend.services.resource_cache import load_template, load_font
+from backend.utils.heif import open_image
 from backend.utils.logger import get_logger
-
-register_heif_opener()
+from backend.utils.timing import StageTimer
 
 logger = get_logger()
 
 
+def to_data_url(buffer: io.BytesIO, mimetype: str = "image/jpeg") -> str:
+    """Encode a rendered image buffer as a base64 data URL."""
+    encoded = base64.b64encode(buffer.getbuffer()).decode("ascii")
+    return f"data:{mimetype};base64,{encoded}"
+
+
+@dataclass(frozen=True)
+class RenderSpec:
+    """Immutable description of a single render.
+
+    Position and size values are fractions of the template dimensions, as
+    returned by validate_position_params; output fields are as returned by
+    validate_output_params. None means "use the default".
+    """
+    username: str = ""
+    template_path: Path = DEFAULT_TEMPLATE_PATH
+    font_path: Path = DEFAULT_FONT_PATH
+    image_x: float = None
+    image_y: float = None
+    image_size: float = None
+    image_shape: str = None
+    text_x: float = None
+    text_y: float = None
+    font_size: float = None
+    text_color: tuple = None
+    output_format: str = None
+    quality: int = None
+    target_kb: int = None
+    preview: bool = False
+
+
 class ImageProcessor:
-    """Service for processing and generating display pictures."""
+    """Service for processing and generating display pictures.
+
+    render() only reads from the shared resource caches, so a single instance
+    can be used from many threads at once. set_template()/set_font() and
+    process() are kept for callers that configure one processor per use.
+    Nothing is loaded until the first render or warm_up().
+    """
 
     def __init__(self, template_path: Path = None, font_path: Path = None):
         """Initialize the image processor."""
@@ -32,15 +74,14 @@ class ImageProcessor:
         self.font_path = font_path or DEFAULT_FONT_PATH
         self._template = None
         self._font = None
-        self._load_resources()
 
     def _load_resources(self) -> None:
         """Load template and font resources."""
         try:
-            self._template = Image.open(self.template_path).convert("RGBA")
+            self._template = load_template(self.template_path)
             self.frame_width, self.frame_height = self._template.size
             self._base_font_size = int(self.frame_width * DEFAULT_FONT_SIZE_PERCENT)
-            self._font = ImageFont.truetype(str(self.font_path), self._base_font_size)
+            self._font = load_font(self.font_path, self._base_font_size)
             logger.info(
                 f"Resources loaded: template={self.template_path}, "
                 f"font={self.font_path}, size={self.frame_width}x{self.frame_height}"
@@ -55,7 +96,7 @@ class ImageProcessor:
     def set_template(self, template_path: Path) -> None:
         """Update the template image."""
         self.template_path = template_path
-        self._template = Image.open(template_path).convert("RGBA")
+        self._template = load_template(template_path)
         self.frame_width, self.frame_height = self._template.size
         self._base_font_size = int(self.frame_width * DEFAULT_FONT_SIZE_PERCENT)
         logger.info(f"Template updated: {template_path}")
@@ -63,7 +104,8 @@ class ImageProcessor:
     def set_font(self, font_path: Path) -> None:
         """Update the font."""
         self.font_path = font_path
-        self._font = ImageFont.truetype(str(font_path), self._base_font_size)
+        if self._template is not None:
+            self._font = load_font(font_path, self._base_font_size)
         logger.info(f"Font updated: {font_path}")
 
     def process(
@@ -79,63 +121,156 @@ class ImageProcessor:
         font_size: float = None,
         text_color: tuple = None,
     ) -> str:
-        """Process an image and generate a display picture."""
-        if not self._template or not self._font:
-            raise RuntimeError("Resources not loaded")
-
-        logger.info(f"Processing image for user: {username}")
-
-        photo_size = image_size or DEFAULT_CIRCLE_SIZE_PERCENT
-        photo_y = image_y if image_y is not None else DEFAULT_CIRCLE_Y_PERCENT
-        photo_x_offset = image_x if image_x is not None else 0.5
-        photo_shape = image_shape or 'circle'
-        text_x_pos = text_x if text_x is not None else 0.5
-        text_y_pos = text_y or DEFAULT_TEXT_Y_PERCENT
-        font_size_pct = font_size or DEFAULT_FONT_SIZE_PERCENT
-        color = text_color or DEFAULT_TEXT_COLOR
+        """Process an image with this processor's template and font."""
+        if self._template is None or self._font is None:
+            self._load_resources()
+
+        spec = RenderSpec(
+            username=username,
+            template_path=self.template_path,
+            font_path=self.font_path,
+            image_x=image_x,
+            image_y=image_y,
+            image_size=image_size,
+            image_shape=image_shape,
+            text_x=text_x,
+            text_y=text_y,
+            font_size=font_size,
+            text_color=text_color,
+        )
+        return self.render(spec, image_data)
+
+    def render(self, spec: RenderSpec, image_data: bytes, timer: StageTimer = None) -> str:
+        """Render a display picture described by spec as a data URL."""
+        timer = timer or StageTimer()
+        buffer = self.render_to_buffer(spec, image_data, timer)
+        with timer.stage("base64"):
+            return to_data_url(buffer, get_encoder(spec.output_format).mimetype)
+
+    def render_to_buffer(self, spec: RenderSpec, image_data: bytes, timer: StageTimer = None) -> io.BytesIO:
+        """Render a display picture described by spec without touching instance state.
+
+        image_data may be the photo bytes, a binary file object, such as an
+        upload's spooled stream, which is read in place without copying it, or
+        a photo already prepared by decode_photo() for this spec's diameter.
+        Returns the encoded image in a buffer positioned at the start. Stage
+        times are recorded in the metrics histograms and, when a timer is
+        given, also added to it.
+        """
+        stages = StageTimer()
+        username = spec.username
+        logger.info("Processing image for user: %s", username)
+
+        photo_size = spec.image_size or DEFAULT_CIRCLE_SIZE_PERCENT
+        photo_y = spec.image_y if spec.image_y is not None else DEFAULT_CIRCLE_Y_PERCENT
+        photo_x_offset = spec.image_x if spec.image_x is not None else 0.5
+        photo_shape = spec.image_shape or 'circle'
+        text_x_pos = spec.text_x if spec.text_x is not None else 0.5
+        text_y_pos = spec.text_y or DEFAULT_TEXT_Y_PERCENT
+        font_size_pct = spec.font_size or DEFAULT_FONT_SIZE_PERCENT
+        color = spec.text_color or DEFAULT_TEXT_COLOR
 
         try:
-            user_image = Image.open(io.BytesIO(image_data))
+            template = load_template(spec.template_path)
+            frame_width, frame_height = template.size
 
-            try:
-                user_image = ImageOps.exif_transpose(user_image)
-            except Exception:
-                pass
+            photo_diameter = int(frame_width * photo_size)
 
-            user_image = user_image.convert("RGBA")
-
-            photo_diameter = int(self.frame_width * photo_size)
-
-            user_image_resized = self._resize_and_crop(user_image, photo_diameter, photo_diameter)
+            user_image_resized = self.decode_photo(image_data, photo_diameter, stages)
 
             if photo_shape == 'circle':
-                mask = self._create_circular_mask(photo_diameter)
-                user_image_resized.putalpha(mask)
+                with stages.stage("mask"):
+                    mask = get_circular_mask(photo_diameter)
+                    user_image_resized.putalpha(mask)
+
+            with stages.stage("composite"):
+                # The one full-frame pass: converting the shared, read-only RGBA
+                # template creates the RGB output buffer, and only the photo and
+                # text boxes are blended into it.
+                result = template.convert("RGB")
 
-            result = self._template.copy()
+                paste_x = int((frame_width * photo_x_offset) - (photo_diameter / 2))
+                paste_y = int(frame_height * photo_y) - (photo_diameter // 2)
 
-            paste_x = int((self.frame_width * photo_x_offset) - (photo_diameter / 2))
-            paste_y = int(self.frame_height * photo_y) - (photo_diameter // 2)
+                result.paste(user_image_resized, (paste_x, paste_y), user_image_resized)
 
-            result.paste(user_image_resized, (paste_x, paste_y), user_image_resized)
+            with stages.stage("text"):
+                self._add_username_text(
+                    result, username, spec.font_path, result.size, text_x_pos, text_y_pos, font_size_pct, color[:3]
+                )
 
-            draw = ImageDraw.Draw(result)
-            self._add_username_text(draw, username, text_x_pos, text_y_pos, font_size_pct, color)
+            if spec.preview:
+                with stages.stage("preview"):
+                    factor = -(-max(result.size) // PREVIEW_MAX_SIZE)
+                    if factor > 1:
+                        result = result.reduce(factor)
 
-            result_rgb = result.convert("RGB")
-            img_io = io.BytesIO()
-            result_rgb.save(img_io, "JPEG", quality=90, optimize=False)
-            img_io.seek(0)
+            with stages.stage("encode"):
+                img_io = encode(result, spec.output_format, spec.quality, spec.target_kb)
 
-            img_base64 = base64.b64encode(img_io.getvalue()).decode("utf-8")
-            logger.info(f"Image processed successfully for: {username}")
+            observe_stages(stages)
+            if timer is not None:
+                timer.add(stages)
 
-            return f"data:image/jpeg;base64,{img_base64}"
+            logger.info("Image processed successfully for: %s", username)
+            return img_io
 
         except Exception as e:
             logger.error(f"Image processing failed: {e}", exc_info=True)
             raise
 
+    def warm_up(self, spec: RenderSpec = None) -> None:
+        """Load spec's template and font and run one throwaway render.
+
+        The render also fills the mask cache and glyph atlas and loads the
+        encoder, so the first real request pays for none of them. Without a
+        spec the default template and font are used.
+        """
+        spec = spec or RenderSpec(username="Warm Up")
+        diameter = self.photo_diameter(spec)
+        self.render_to_buffer(spec, Image.new("RGBA", (diameter, diameter)))
+
+    def photo_diameter(self, spec: RenderSpec) -> int:
+        """Return the photo diameter in pixels that spec renders at."""
+        frame_width = load_template(spec.template_path).width
+        return int(frame_width * (spec.image_size or DEFAULT_CIRCLE_SIZE_PERCENT))
+
+    def decode_photo(self, image_data, diameter: int, timer: StageTimer = None) -> Image.Image:
+        """Decode an uploaded photo straight to a diameter x diameter RGBA square.
+
+        draft() lets JPEG decode at a reduced DCT scale and HEIF pick an embedded
+        thumbnail no smaller than the target, so phone photos are never decoded at
+        full resolution. Orientation and RGBA conversion are applied after the
+        downscale; a centred square crop commutes with EXIF rotation and flips.
+        An already decoded photo is returned as a copy the caller may modify.
+        """
+        timer = timer or StageTimer()
+        if isinstance(image_data, Image.Image):
+            return image_data.copy()
+
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            image_data = io.BytesIO(image_data)
+        else:
+            image_data.seek(0)
+
+        with timer.stage("decode"):
+            image = open_image(image_data)
+            image.draft("RGB", (diameter, diameter))
+            image.load()
+
+            if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA")
+
+        with timer.stage("resize"):
+            image = self._resize_and_crop(image, diameter, diameter)
+
+            try:
+                image = ImageOps.exif_transpose(image)
+            except Exception:
+                pass
+
+            return image.convert("RGBA")
+
     def _resize_and_crop(self, image: Image.Image, target_width: int, target_height: int) -> Image.Image:
         """Resize and crop image to fit target dimensions."""
         max_dimension = 1024
@@ -161,48 +296,44 @@ class ImageProcessor:
 
         return image.crop((left, top, right, bottom))
 
-    def _create_circular_mask(self, size: int) -> Image.Image:
-        """Create a circular mask for the profile picture."""
-        mask = Image.new("L", (size, size), 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((0, 0, size, size), fill=255)
-        return mask
-
     def _add_username_text(
         self,
-        draw: ImageDraw.ImageDraw,
+        image: Image.Image,
         username: str,
+        font_path: Path,
+        frame_size: tuple,
         text_x: float,
         text_y: float,
         font_size_pct: float,
         color: tuple,
     ) -> None:
         """Add username text to the image."""
+        frame_width, frame_height = frame_size
         username = username.upper()
-        text_box_width = int(self.frame_width * 0.4)
+        text_box_width = int(frame_width * 0.4)
 
-        base_size = int(self.frame_width * font_size_pct)
+        base_size = int(frame_width * font_size_pct)
 
         if len(username) > 15:
             base_size = int(base_size * (15 / len(username)))
 
-        font = self._font.font_variant(size=base_size)
+        atlas = get_glyph_atlas(font_path, base_size)
 
-        avg_char_width = sum(font.getbbox(c)[2] for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ") / 26
-        max_chars_per_line = int(text_box_width / avg_char_width)
+        max_chars_per_line = int(text_box_width / atlas.avg_char_width)
         lines = textwrap.wrap(username, width=max_chars_per_line, break_long_words=True)
 
         if not lines:
             return
 
-        line_heights = [font.getbbox(line)[3] - font.getbbox(line)[1] for line in lines]
+        line_boxes = [atlas.line_bbox(line) for line in lines]
+        line_heights = [box[3] - box[1] for box in line_boxes]
         total_text_height = sum(line_heights) + (len(lines) - 1) * int(base_size * 0.3)
-        text_box_center_y = int(self.frame_height * text_y)
+        text_box_center_y = int(frame_height * text_y)
         start_y = text_box_center_y - (total_text_height // 2)
 
         current_y = start_y
-        for line, line_height in zip(lines, line_heights):
-            text_width = font.getbbox(line)[2]
-            line_x = int(self.frame_width * text_x) - (text_width // 2)
-            draw.text((line_x, current_y), line, fill=color, font=font)
+        for line, box, line_height in zip(lines, line_boxes, line_heights):
+            text_width = box[2]
+            line_x = int(frame_width * text_x) - (text_width // 2)
+            atlas.draw_line(image, (line_x, current_y), line, color)
             current_y += line_height + int(base_size * 0.3)
@@ -0,0 +1,159 @@
+"""Asynchronous render jobs backed by a local SQLite store."""
+
+import atexit
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+
+from backend.config import JOB_CPU_SECONDS, JOB_DB_PATH, JOB_QUEUE_SIZE, JOB_TTL_SECONDS, JOB_WORKERS
+from backend.services.image_processor import RenderSpec
+from backend.services.render_pool import RenderPool, RenderTimeout
+from backend.utils.logger import get_logger
+
+logger = get_logger()
+
+JOB_QUEUED = "queued"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobStore:
+    """Job status and results in SQLite, shared by all gunicorn workers."""
+
+    def __init__(self, db_path: Path, ttl_seconds: int):
+        """Open the store and create its table if needed."""
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT, result BLOB, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection that commits on success and always closes."""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self) -> str:
+        """Record a new queued job and return its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, now, now),
+            )
+        return job_id
+
+    def finish(self, job_id: str, result: bytes = None, error: str = None) -> None:
+        """Store the outcome of a job."""
+        status = JOB_FAILED if error else JOB_DONE
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str):
+        """Return the job as a dict, or None if it is unknown or expired."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, error, result, created_at FROM jobs WHERE id = ? AND updated_at >= ?",
+                (job_id, time.time() - self.ttl_seconds),
+            ).fetchone()
+
+        if row is None:
+            return None
+        return {"job_id": job_id, "status": row[0], "error": row[1], "result": row[2], "created_at": row[3]}
+
+    def purge_expired(self) -> int:
+        """Delete jobs older than the TTL and return how many were removed."""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            return cursor.rowcount
+
+
+class JobQueue:
+    """Runs render jobs in a worker pool and records results in a JobStore."""
+
+    def __init__(self, store: JobStore, pool: RenderPool, cpu_seconds: int):
+        """Create a queue over an existing store and pool."""
+        self.store = store
+        self.pool = pool
+        self.cpu_seconds = cpu_seconds
+
+    def submit(self, spec: RenderSpec, image_data: bytes) -> str:
+        """Queue a render and return the job id without waiting for it.
+
+        Raises RenderPoolFull when no queue slots are free.
+        """
+        removed = self.store.purge_expired()
+        if removed:
+            logger.info(f"Purged {removed} expired jobs")
+
+        job_id = self.store.create()
+        try:
+            future = self.pool.submit(spec, image_data, self.cpu_seconds)
+        except Exception:
+            self.store.finish(job_id, error="Job could not be queued")
+            raise
+
+        future.add_done_callback(lambda f: self._record(job_id, f))
+        logger.info("Job queued: %s", job_id)
+        return job_id
+
+    def _record(self, job_id: str, future) -> None:
+        """Write a finished future's outcome to the store."""
+        error = None if future.cancelled() else future.exception()
+        try:
+            if future.cancelled():
+                logger.warning(f"Job {job_id} was cancelled")
+                self.store.finish(job_id, error="Job was cancelled")
+            elif error is None:
+                self.store.finish(job_id, result=future.result().getvalue())
+                logger.info("Job finished: %s", job_id)
+            elif isinstance(error, RenderTimeout):
+                logger.warning(f"Job {job_id} exceeded its CPU time limit")
+                self.store.finish(job_id, error="Processing took too long")
+            elif isinstance(error, BrokenProcessPool):
+                logger.warning(f"Job {job_id} lost its worker, which was killed or crashed")
+                self.store.finish(job_id, error="Processing took too long or crashed")
+            else:
+                logger.error(f"Job {job_id} failed: {error}")
+                self.store.finish(job_id, error="Failed to process image")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to record job {job_id}: {e}")
+
+    def get(self, job_id: str):
+        """Return the job dict, or None if it is unknown or expired."""
+        return self.store.get(job_id)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the shared job queue, starting its worker pool on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                pool = RenderPool(JOB_WORKERS, JOB_QUEUE_SIZE, name="jobs", max_tasks_per_child=1)
+                atexit.register(pool.shutdown)
+                _queue = JobQueue(JobStore(JOB_DB_PATH, JOB_TTL_SECONDS), pool, JOB_CPU_SECONDS)
+    return _queue
@@ -0,0 +1,160 @@
+"""Memoized layout data and glyph masks that depend only on the font, size and photo diameter."""
+
+import string
+from functools import lru_cache
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFont
+
+from backend.config import MASK_SUPERSAMPLE
+from backend.services.resource_cache import load_font, file_key
+
+MEASURED_GLYPHS = string.ascii_uppercase + string.digits + " -.'&"
+
+
+@lru_cache(maxsize=64)
+def get_circular_mask(size: int, supersample: int = MASK_SUPERSAMPLE) -> Image.Image:
+    """Return a shared circular "L" mask of the given size.
+
+    With supersample > 1 the ellipse is drawn at a larger scale and reduced,
+    which anti-aliases the edge. The returned image must not be modified.
+    """
+    scaled = size * supersample
+    mask = Image.new("L", (scaled, scaled), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.ellipse((0, 0, scaled, scaled), fill=255)
+
+    if supersample > 1:
+        mask = mask.resize((size, size), Image.Resampling.LANCZOS)
+    return mask
+
+
+class FontMetrics:
+    """Per-glyph advance and bounding-box tables for one font at one size."""
+
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        """Measure the common glyphs of font once."""
+        self.font = font
+        self._advances = {}
+        self._bboxes = {}
+        for char in MEASURED_GLYPHS:
+            self._measure(char)
+
+        self.avg_char_width = sum(self._bboxes[c][2] for c in string.ascii_uppercase) / 26
+
+    def _measure(self, char: str) -> None:
+        """Record the advance and ink box of a single glyph."""
+        self._advances[char] = self.font.getlength(char)
+        self._bboxes[char] = self.font.getbbox(char)
+
+    def line_bbox(self, line: str) -> tuple:
+        """Return the (left, top, right, bottom) ink box of line, like font.getbbox."""
+        if any(char not in self._bboxes for char in line):
+            return self.font.getbbox(line)
+
+        x = 0.0
+        left = top = right = bottom = None
+        for char in line:
+            char_left, char_top, char_right, char_bottom = self._bboxes[char]
+            if char_right > char_left:
+                left = x + char_left if left is None else min(left, x + char_left)
+                right = x + char_right if right is None else max(right, x + char_right)
+                top = char_top if top is None else min(top, char_top)
+                bottom = char_bottom if bottom is None else max(bottom, char_bottom)
+            x += self._advances[char]
+
+        if left is None:
+            return 0, 0, 0, 0
+        return int(left), top, int(round(right)), bottom
+
+
+class GlyphAtlas(FontMetrics):
+    """Font metrics plus pre-rendered masks of the measured glyphs.
+
+    draw_line() places the cached masks at their advance and kerning
+    offsets, as FreeType lays the line out, instead of rasterizing every
+    glyph again. The masks hold coverage only, so one atlas serves every
+    text colour.
+    """
+
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        """Measure and rasterize the common glyphs of font once."""
+        super().__init__(font)
+        self._kerning = {}
+        self._masks = {char: self._rasterize(char) for char in MEASURED_GLYPHS}
+        # Shaping engines can substitute glyphs, so their lines are checked against getlength().
+        self._shaped = font.layout_engine != ImageFont.Layout.BASIC
+
+    def _rasterize(self, char: str):
+        """Return the coverage mask of a glyph's ink box, or None if it has no ink."""
+        left, top, right, bottom = self._bboxes[char]
+        if right <= left or bottom <= top:
+            return None
+        mask = Image.new("L", (right - left, bottom - top), 0)
+        ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=self.font)
+        return mask
+
+    def _kern(self, prev: str, char: str) -> float:
+        """Return the kerning adjustment between two glyphs."""
+        pair = prev + char
+        offset = self._kerning.get(pair)
+        if offset is None:
+            offset = self.font.getlength(pair) - self._advances[prev] - self._advances[char]
+            self._kerning[pair] = offset
+        return offset
+
+    def _layout(self, line: str):
+        """Return [(x, y, mask)] for the inked glyphs of line, or None if the atlas cannot draw it."""
+        if any(char not in self._masks for char in line):
+            return None
+
+        placed = []
+        pen = 0.0
+        prev = None
+        for char in line:
+            if prev is not None:
+                pen += self._kern(prev, char)
+            mask = self._masks[char]
+            if mask is not None:
+                left, top = self._bboxes[char][:2]
+                placed.append((int(pen + 0.5) + left, top, mask))
+            pen += self._advances[char]
+            prev = char
+
+        if self._shaped and abs(pen - self.font.getlength(line)) > 0.01:
+            return None
+        return placed
+
+    def draw_line(self, image: Image.Image, xy: tuple, line: str, fill: tuple) -> None:
+        """Draw line with its top-left anchor at xy, like ImageDraw.text.
+
+        Lines with glyphs outside the atlas are rasterized by FreeType.
+        """
+        placed = self._layout(line)
+        if placed is None:
+            ImageDraw.Draw(image).text(xy, line, fill=fill, font=self.font)
+            return
+        if not placed:
+            return
+
+        left = min(x for x, _, _ in placed)
+        top = min(y for _, y, _ in placed)
+        right = max(x + mask.width for x, _, mask in placed)
+        bottom = max(y + mask.height for _, y, mask in placed)
+
+        # Later glyphs are blended over earlier ones, as in Pillow's own line bitmap.
+        line_mask = Image.new("L", (right - left, bottom - top), 0)
+        for x, y, mask in placed:
+            line_mask.paste(255, (x - left, y - top), mask)
+        image.paste(fill, (xy[0] + left, xy[1] + top), line_mask)
+
+
+def get_glyph_atlas(font_path: Path, size: int) -> GlyphAtlas:
+    """Return the cached glyph atlas for a font file at a size."""
+    return _atlas_for_key(file_key(font_path) + (size,))
+
+
+@lru_cache(maxsize=64)
+def _atlas_for_key(key: tuple) -> GlyphAtlas:
+    """Build an atlas for a (path, mtime, size) key."""
+    path, _, size = key
+    return GlyphAtlas(load_font(Path(path), size))
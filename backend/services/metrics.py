@@ -0,0 +1,323 @@
+"""Histograms, counters and gauges exposed in the Prometheus text format.
+
+Each process keeps its metrics in memory and a background thread writes a
+snapshot to ``METRICS_DIR/<pid>.json`` once per flush interval when anything
+changed. Recording an observation never touches the disk. /metrics merges
+the snapshots of every gunicorn worker and render worker, so any worker can
+answer a scrape. Counters and histograms of exited processes are folded
+into a single ``dead.json`` and their snapshot files deleted; their gauges
+are dropped.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from backend.config import METRICS_FLUSH_SECONDS
+from backend.utils.logger import get_logger
+from backend.utils.timing import StageTimer
+
+logger = get_logger()
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    "dp_stage_seconds": ("histogram", "Time spent in each stage of handling a render."),
+    "dp_request_seconds": ("histogram", "Time spent handling API requests."),
+    "dp_startup_seconds": ("histogram", "Time each process spent starting up, by phase."),
+    "dp_encode_seconds": ("histogram", "Time spent encoding output images, by format."),
+    "dp_cache_hits_total": ("counter", "Cache lookups that found an entry."),
+    "dp_cache_misses_total": ("counter", "Cache lookups that found nothing."),
+    "dp_cache_evictions_total": ("counter", "Entries evicted to stay within the cache budget."),
+    "dp_cache_bytes": ("gauge", "Estimated private bytes held by each cache, summed over processes."),
+    "dp_cache_shared_bytes": ("gauge", "Bytes of memory-mapped data held by each cache, largest of any process."),
+    "dp_queue_depth": ("gauge", "Renders queued or running in each worker pool."),
+}
+
+# Gauges of memory every process maps from the same files, merged with max instead of sum.
+SHARED_GAUGES = {"dp_cache_shared_bytes"}
+
+DEAD_SNAPSHOT = "dead.json"
+
+_collectors = []
+
+
+def register_collector(collect) -> None:
+    """Register collect() -> [(kind, name, labels, value)] to run at each flush.
+
+    kind is "counter" or "gauge"; labels is a dict. Collectors report state
+    the owning module already tracks, such as cache counters.
+    """
+    _collectors.append(collect)
+
+
+def _label_key(labels: dict) -> str:
+    """Serialize labels into a stable key."""
+    return json.dumps(labels, sort_keys=True)
+
+
+class MetricsRegistry:
+    """Metrics recorded by one process, periodically saved for other processes."""
+
+    def __init__(self, directory: Path, flush_seconds: float):
+        """Create an empty registry writing snapshots into directory."""
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher_pid = None
+        directory.mkdir(parents=True, exist_ok=True)
+        # A snapshot under this PID was left by an exited process that had the same PID.
+        self.fold_exited(include_own=True)
+
+    def _ensure_flusher(self) -> None:
+        """Start the flush thread in this process, including after a fork."""
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self) -> None:
+        """Write a snapshot every flush interval while there are new observations."""
+        while True:
+            time.sleep(self.flush_seconds)
+            if self._dirty:
+                self.flush()
+
+    def observe(self, name: str, value: float, labels: dict) -> None:
+        """Add an observation to a histogram."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+            histogram["buckets"][bisect_left(BUCKETS, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            self._dirty = True
+        self._ensure_flusher()
+
+    def snapshot(self) -> dict:
+        """Return this process's metrics as a JSON-serializable dict."""
+        with self._lock:
+            histograms = [
+                {"name": name, "labels": labels, **dict(data, buckets=list(data["buckets"]))}
+                for (name, labels), data in self._histograms.items()
+            ]
+
+        samples = []
+        for collect in _collectors:
+            try:
+                samples.extend(
+                    {"kind": kind, "name": name, "labels": _label_key(labels), "value": value}
+                    for kind, name, labels, value in collect()
+                )
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+
+        return {"pid": os.getpid(), "histograms": histograms, "samples": samples}
+
+    def flush(self) -> None:
+        """Write this process's snapshot for other processes to read."""
+        self._dirty = False
+        try:
+            _write_snapshot(self.directory / f"{os.getpid()}.json", self.snapshot())
+        except OSError as e:
+            logger.error(f"Failed to write metrics snapshot: {e}")
+
+    @contextmanager
+    def _directory_lock(self):
+        """Hold an exclusive lock on the snapshot directory across processes."""
+        with open(self.directory / ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def fold_exited(self, include_own: bool = False) -> None:
+        """Merge the snapshots of exited processes into dead.json and delete them.
+
+        With include_own, a snapshot named after this process's PID is
+        treated as left over from an earlier process with the same PID.
+        """
+        with self._directory_lock():
+            folded = []
+            dead = _read_snapshot(self.directory / DEAD_SNAPSHOT) or {"pid": None, "histograms": [], "samples": []}
+            for path in self.directory.glob("*.json"):
+                if not path.stem.isdigit():
+                    continue
+                own = int(path.stem) == os.getpid()
+                if (own and not include_own) or (not own and _process_alive(int(path.stem))):
+                    continue
+                snapshot = _read_snapshot(path)
+                if snapshot is not None:
+                    dead = _accumulate(dead, snapshot)
+                folded.append(path)
+
+            if not folded:
+                return
+            try:
+                _write_snapshot(self.directory / DEAD_SNAPSHOT, dead)
+            except OSError as e:
+                logger.error(f"Failed to write metrics of exited processes: {e}")
+                return
+            for path in folded:
+                path.unlink(missing_ok=True)
+
+    def collect_all(self) -> list:
+        """Flush this process, fold exited processes and return every snapshot."""
+        self.flush()
+        self.fold_exited()
+        snapshots = []
+        for path in self.directory.glob("*.json"):
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+
+def _read_snapshot(path: Path):
+    """Return a saved snapshot, or None if it is missing or unreadable."""
+    try:
+        return json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_snapshot(path: Path, snapshot: dict) -> None:
+    """Save a snapshot so readers never see it half-written."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(snapshot))
+    os.replace(tmp_path, path)
+
+
+def _accumulate(total: dict, snapshot: dict) -> dict:
+    """Add a snapshot's histograms and counters to total; gauges are dropped."""
+    histograms = {(entry["name"], entry["labels"]): entry for entry in total["histograms"]}
+    for entry in snapshot["histograms"]:
+        merged = histograms.setdefault((entry["name"], entry["labels"]), {
+            "name": entry["name"], "labels": entry["labels"],
+            "buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0,
+        })
+        merged["buckets"] = [a + b for a, b in zip(merged["buckets"], entry["buckets"])]
+        merged["sum"] += entry["sum"]
+        merged["count"] += entry["count"]
+
+    counters = {(sample["name"], sample["labels"]): sample for sample in total["samples"]}
+    for sample in snapshot["samples"]:
+        if sample["kind"] != "counter":
+            continue
+        merged = counters.setdefault((sample["name"], sample["labels"]), dict(sample, value=0))
+        merged["value"] += sample["value"]
+
+    return {"pid": None, "histograms": list(histograms.values()), "samples": list(counters.values())}
+
+
+def _process_alive(pid: int) -> bool:
+    """Check whether a process still exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _format_labels(labels: dict) -> str:
+    """Format labels as {a="b",...}, or an empty string."""
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{str(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def format_metrics(snapshots: list) -> str:
+    """Merge process snapshots into the Prometheus text exposition format."""
+    histograms = {}
+    values = {}
+    for snapshot in snapshots:
+        alive = snapshot["pid"] is not None and _process_alive(snapshot["pid"])
+        for entry in snapshot["histograms"]:
+            merged = histograms.setdefault((entry["name"], entry["labels"]), {
+                "buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0,
+            })
+            merged["buckets"] = [a + b for a, b in zip(merged["buckets"], entry["buckets"])]
+            merged["sum"] += entry["sum"]
+            merged["count"] += entry["count"]
+        for sample in snapshot["samples"]:
+            if sample["kind"] == "gauge" and not alive:
+                continue
+            key = (sample["name"], sample["labels"])
+            if sample["name"] in SHARED_GAUGES:
+                values[key] = max(values.get(key, 0), sample["value"])
+            else:
+                values[key] = values.get(key, 0) + sample["value"]
+
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), data in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = json.loads(labels)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), data["buckets"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {data['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {data['count']}")
+        else:
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(json.loads(labels))} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+_registry = None
+
+
+def init_metrics(directory: Path, flush_seconds: float = METRICS_FLUSH_SECONDS) -> None:
+    """Start recording metrics in this process."""
+    global _registry
+    _registry = MetricsRegistry(Path(directory), flush_seconds)
+
+
+def metrics_directory():
+    """Return the snapshot directory, or None when metrics are not recording."""
+    return _registry.directory if _registry is not None else None
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record a histogram observation if metrics are enabled."""
+    if _registry is not None:
+        _registry.observe(name, value, labels)
+
+
+def observe_stages(timer: StageTimer) -> None:
+    """Record each stage of a timer in the stage histogram."""
+    if _registry is None:
+        return
+    for stage, seconds in timer.stages.items():
+        _registry.observe("dp_stage_seconds", seconds, {"stage": stage})
+
+
+def render_metrics() -> str:
+    """Return metrics from every process in the Prometheus text format."""
+    if _registry is None:
+        return format_metrics([])
+    return format_metrics(_registry.collect_all())
@@ -0,0 +1,80 @@
+"""Photo sessions: upload a photo once, then render it many times by token."""
+
+import hashlib
+import re
+import threading
+from PIL import Image
+
+from backend.config import SESSION_CACHE_MAX_BYTES, SESSION_TTL_SECONDS
+from backend.services.image_processor import ImageProcessor
+from backend.services.resource_cache import LRUCache
+from backend.utils.logger import get_logger
+from backend.utils.validators import ValidationError
+
+logger = get_logger()
+
+TOKEN_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class PhotoSessionExpired(Exception):
+    """Raised when a photo token is unknown or its session has expired."""
+    pass
+
+
+class PhotoSessions:
+    """Uploaded photos and their decoded crops, keyed by the photo's SHA-256.
+
+    The original bytes are kept so the photo can be decoded again for a
+    different diameter. Both are evicted together by size and TTL.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: int):
+        """Initialize an empty session store."""
+        self.ttl_seconds = ttl_seconds
+        self.cache = LRUCache("session", max_bytes, ttl_seconds)
+        self._processor = None
+        self._lock = threading.Lock()
+
+    @property
+    def processor(self) -> ImageProcessor:
+        """Return the processor used to decode photos, creating it on first use."""
+        if self._processor is None:
+            with self._lock:
+                if self._processor is None:
+                    self._processor = ImageProcessor()
+        return self._processor
+
+    def create(self, image_data: bytes, diameter: int = None) -> str:
+        """Store a photo, decode it for diameter if given, and return its token."""
+        token = hashlib.sha256(image_data).hexdigest()
+        self.cache.put(("photo", token), image_data, len(image_data))
+        if diameter:
+            self.get_photo(token, diameter)
+        logger.info("Photo session stored: %s", token[:12])
+        return token
+
+    def get_photo(self, token: str, diameter: int) -> Image.Image:
+        """Return the decoded photo for token at diameter.
+
+        The returned image is shared and must not be modified. Raises
+        ValidationError for a malformed token and PhotoSessionExpired if the
+        token is not known.
+        """
+        if not TOKEN_PATTERN.fullmatch(token or ""):
+            raise ValidationError("Invalid photo token")
+
+        key = ("crop", token, diameter)
+        photo = self.cache.get(key)
+        if photo is not None:
+            return photo
+
+        image_data = self.cache.get(("photo", token))
+        if image_data is None:
+            raise PhotoSessionExpired("Photo session expired")
+
+        photo = self.processor.decode_photo(image_data, diameter)
+        self.cache.put(key, photo, diameter * diameter * 4)
+        return photo
+
+
+photo_sessions = PhotoSessions(SESSION_CACHE_MAX_BYTES, SESSION_TTL_SECONDS)
@@ -0,0 +1,210 @@
+"""Optional process pool for rendering outside the request threads."""
+
+import atexit
+import io
+import multiprocessing
+import resource
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from backend.config import BATCH_WORKERS, JOB_CPU_GRACE_SECONDS, RENDER_WORKERS, RENDER_QUEUE_SIZE
+from backend.services.image_processor import ImageProcessor, RenderSpec
+from backend.services.metrics import init_metrics, metrics_directory, register_collector
+from backend.utils.logger import get_logger, setup_logger
+
+logger = get_logger()
+
+_worker_processor = None
+_pools = []
+
+
+class RenderTimeout(Exception):
+    """Raised inside a worker when a render exceeds its CPU time limit."""
+    pass
+
+
+def _cpu_limit_exceeded(signum, frame):
+    """SIGXCPU handler that aborts the current render."""
+    raise RenderTimeout("Render exceeded its CPU time limit")
+
+
+def init_worker(metrics_dir=None) -> None:
+    """Warm the default template, font and render path once per worker process.
+
+    With metrics_dir, the worker records render stage metrics there too.
+    """
+    global _worker_processor
+    setup_logger()
+    if metrics_dir is not None:
+        init_metrics(metrics_dir)
+    signal.signal(signal.SIGXCPU, _cpu_limit_exceeded)
+    _worker_processor = ImageProcessor()
+    _worker_processor.warm_up()
+
+
+def render_in_worker(
+    spec: RenderSpec, image_data: bytes, cpu_seconds: int = None, grace_seconds: int = JOB_CPU_GRACE_SECONDS
+) -> io.BytesIO:
+    """Render inside a worker process using its warm resource caches.
+
+    With cpu_seconds, RLIMIT_CPU is set to the CPU time used so far plus the
+    budget. Once the render overruns, the kernel signals SIGXCPU, and the
+    render raises RenderTimeout at its next Python bytecode. A render stuck
+    in C code never gets there, so the hard limit is grace_seconds later and
+    the kernel kills the worker. A lowered hard limit cannot be raised again,
+    so the worker must not run another task; RenderPool only accepts CPU
+    limits with max_tasks_per_child=1.
+    """
+    if not cpu_seconds:
+        return _worker_processor.render_to_buffer(spec, image_data)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft_limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    hard_limit = soft_limit + grace_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft_limit, hard_limit = min(soft_limit, hard), min(hard_limit, hard)
+
+    resource.setrlimit(resource.RLIMIT_CPU, (soft_limit, hard_limit))
+    return _worker_processor.render_to_buffer(spec, image_data)
+
+
+class RenderPoolFull(Exception):
+    """Raised when the render pool has no free queue slots."""
+    pass
+
+
+class RenderPool:
+    """Pool of worker processes with a bounded number of in-flight renders."""
+
+    def __init__(self, workers: int, queue_size: int, name: str = "render", max_tasks_per_child: int = None):
+        """Start the pool. At most workers + queue_size renders are admitted at once.
+
+        With max_tasks_per_child, each worker is replaced after that many renders.
+        """
+        self.name = name
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.capacity = workers + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._executor = self._create_executor()
+        _pools.append(self)
+        logger.info(f"Render pool started: name={name}, workers={workers}, queue_size={queue_size}")
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        """Create the underlying executor with spawned, pre-warmed workers."""
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(metrics_directory(),),
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a broken executor, unless another thread already has."""
+        with self._lock:
+            if self._executor is broken:
+                logger.error(f"Render pool {self.name} broken, restarting workers")
+                self._executor = self._create_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future) -> None:
+        """Free a queue slot once a render finishes."""
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def submit(self, spec: RenderSpec, image_data: bytes, cpu_seconds: int = None):
+        """Queue a render and return its future, or raise RenderPoolFull.
+
+        If a worker dies, for example when the kernel kills a render over its
+        CPU limit, the futures of the renders the pool was running fail with
+        BrokenProcessPool and the next submit restarts the workers.
+        """
+        if cpu_seconds and self.max_tasks_per_child != 1:
+            raise ValueError("CPU-limited renders need a pool with max_tasks_per_child=1")
+        if not self._slots.acquire(blocking=False):
+            raise RenderPoolFull("Render queue is full")
+
+        with self._lock:
+            self._in_flight += 1
+
+        try:
+            executor = self._executor
+            try:
+                future = executor.submit(render_in_worker, spec, image_data, cpu_seconds)
+            except BrokenProcessPool:
+                self._restart(executor)
+                future = self._executor.submit(render_in_worker, spec, image_data, cpu_seconds)
+        except Exception:
+            self._release(None)
+            raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    def render_to_buffer(self, spec: RenderSpec, image_data: bytes) -> io.BytesIO:
+        """Render in a worker process and wait for the encoded image."""
+        return self.submit(spec, image_data).result()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of renders queued or running."""
+        return self._in_flight
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _collect_pool_metrics() -> list:
+    """Report the queue depth of every render pool in this process."""
+    return [("gauge", "dp_queue_depth", {"pool": pool.name}, pool.in_flight) for pool in _pools]
+
+
+register_collector(_collect_pool_metrics)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Return the shared render pool, or None when RENDER_WORKERS is 0."""
+    global _pool
+    if RENDER_WORKERS <= 0:
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = RenderPool(RENDER_WORKERS, RENDER_QUEUE_SIZE)
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+_batch_pool = None
+
+
+def get_batch_pool() -> RenderPool:
+    """Return the pool batch requests render in.
+
+    That is the shared render pool when RENDER_WORKERS is set, otherwise a
+    pool of BATCH_WORKERS processes shared by every batch in this process.
+    """
+    global _batch_pool
+    pool = get_render_pool()
+    if pool is not None:
+        return pool
+
+    if _batch_pool is None:
+        with _pool_lock:
+            if _batch_pool is None:
+                _batch_pool = RenderPool(BATCH_WORKERS, BATCH_WORKERS, name="batch")
+                atexit.register(_batch_pool.shutdown)
+    return _batch_pool
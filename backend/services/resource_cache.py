@@ -0,0 +1,187 @@
+"""Process-wide cache of decoded templates and parsed fonts."""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image, ImageFont
+
+from backend.config import TEMPLATE_CACHE_MAX_BYTES, FONT_CACHE_MAX_BYTES
+from backend.services.metrics import register_collector
+from backend.services.template_store import load_prepared_template
+from backend.utils.heif import open_image
+from backend.utils.logger import get_logger
+
+logger = get_logger()
+
+_caches = []
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the estimated size of its entries.
+
+    With ttl_seconds, entries also expire that long after they were stored.
+    Entries put with shared=True live in memory shared between processes,
+    such as a memory-mapped file; they count against the budget like any
+    other entry but are also reported separately as shared_bytes.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl_seconds: float = None):
+        """Initialize an empty cache."""
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.shared_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _caches.append(self)
+
+    def _drop(self, entry) -> None:
+        """Remove a popped entry's size from the byte counters."""
+        self.current_bytes -= entry[1]
+        if entry[3]:
+            self.shared_bytes -= entry[1]
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                del self._entries[key]
+                self._drop(entry)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size: int, shared: bool = False) -> None:
+        """Store a value and evict least recently used entries over budget."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._drop(old)
+
+            if size > self.max_bytes:
+                logger.warning(f"{self.name} cache entry too large to cache ({size} bytes)")
+                return
+
+            expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+            self._entries[key] = (value, size, expires_at, shared)
+            self.current_bytes += size
+            if shared:
+                self.shared_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._drop(evicted)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Return the cached value, calling loader() -> (value, size) on a miss."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        value, size = loader()
+        self.put(key, value, size)
+        return value
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.shared_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "shared_bytes": self.shared_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+template_cache = LRUCache("template", TEMPLATE_CACHE_MAX_BYTES)
+font_cache = LRUCache("font", FONT_CACHE_MAX_BYTES)
+
+
+def file_key(path: Path) -> tuple:
+    """Build a cache key that changes when the file is replaced."""
+    path = str(path)
+    return path, os.stat(path).st_mtime_ns
+
+
+def load_template(path: Path) -> Image.Image:
+    """Return the decoded RGBA template at path.
+
+    The returned image is shared between callers and must not be modified.
+    Prepared templates are memory-mapped and count as shared memory.
+    """
+    key = file_key(path)
+    image = template_cache.get(key)
+    if image is not None:
+        return image
+
+    try:
+        image = load_prepared_template(path)
+        shared = True
+    except OSError as e:
+        logger.warning(f"Prepared template unavailable for {path}: {e}")
+        image = open_image(path).convert("RGBA")
+        shared = False
+    logger.info(f"Template loaded into cache: {path}")
+    template_cache.put(key, image, image.width * image.height * 4, shared=shared)
+    return image
+
+
+def load_font(path: Path, size: int) -> ImageFont.FreeTypeFont:
+    """Return the font at path parsed at the given pixel size."""
+    key = file_key(path) + (size,)
+
+    def loader():
+        font = ImageFont.truetype(str(path), size)
+        return font, os.path.getsize(path)
+
+    return font_cache.get_or_load(key, loader)
+
+
+def _collect_cache_metrics() -> list:
+    """Report the counters of every LRUCache in this process."""
+    samples = []
+    for cache in _caches:
+        stats = cache.stats()
+        labels = {"cache": cache.name}
+        samples.append(("counter", "dp_cache_hits_total", labels, stats["hits"]))
+        samples.append(("counter", "dp_cache_misses_total", labels, stats["misses"]))
+        samples.append(("counter", "dp_cache_evictions_total", labels, stats["evictions"]))
+        samples.append(("gauge", "dp_cache_bytes", labels, stats["bytes"] - stats["shared_bytes"]))
+        samples.append(("gauge", "dp_cache_shared_bytes", labels, stats["shared_bytes"]))
+    return samples
+
+
+register_collector(_collect_cache_metrics)
+
+
+def cache_stats() -> dict:
+    """Return hit/miss counters for all resource caches."""
+    return {
+        "templates": template_cache.stats(),
+        "fonts": font_cache.stats(),
+    }
@@ -0,0 +1,183 @@
+"""Content-addressed cache of rendered images."""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from dataclasses import astuple
+from pathlib import Path
+
+from backend.config import (
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_DISK,
+    RESULT_CACHE_DISK_MAX_BYTES,
+    RESULT_CACHE_TTL_SECONDS,
+)
+from backend.services.encoders import ENCODERS, encoder_for_data
+from backend.services.image_processor import RenderSpec
+from backend.services.resource_cache import LRUCache
+from backend.utils.logger import get_logger
+
+logger = get_logger()
+
+RESULT_EXTENSIONS = sorted({encoder.extension for encoder in ENCODERS.values()})
+
+SWEEP_INTERVAL_SECONDS = 300
+
+
+def _photo_digest(image_data) -> bytes:
+    """Hash photo bytes, or a binary file object in chunks without reading it whole."""
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(image_data).digest()
+
+    image_data.seek(0)
+    digest = hashlib.file_digest(image_data, "sha256").digest()
+    image_data.seek(0)
+    return digest
+
+
+def result_key(spec: RenderSpec, image_data: bytes = None, photo_digest: bytes = None) -> str:
+    """Hash everything that determines the rendered output.
+
+    image_data may be the photo bytes or a binary file object. Pass
+    photo_digest, the photo's SHA-256 digest, instead when it is known.
+    """
+    digest = hashlib.sha256()
+    digest.update(photo_digest or _photo_digest(image_data))
+    digest.update(repr(astuple(spec)).encode("utf-8"))
+    for path in (spec.template_path, spec.font_path):
+        digest.update(str(os.stat(path).st_mtime_ns).encode("ascii"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Rendered images keyed by result_key, in memory with an optional disk tier.
+
+    With ttl_seconds, results expire that long after they were rendered, so
+    photos of attendees are not kept indefinitely. The disk tier is swept in
+    the background at most every SWEEP_INTERVAL_SECONDS, deleting expired
+    files and then the oldest ones until it fits in disk_max_bytes.
+    """
+
+    def __init__(
+        self, max_bytes: int, disk_dir: Path = None, disk_max_bytes: int = None, ttl_seconds: float = None
+    ):
+        """Initialize the cache. Pass disk_dir to also keep results on disk."""
+        self.memory = LRUCache("result", max_bytes, ttl_seconds)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._last_sweep = None
+        self._sweep_lock = threading.Lock()
+        if disk_dir is not None:
+            disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def _disk_path(self, key: str, extension: str) -> Path:
+        """Return the on-disk location for a key in the format with extension."""
+        return self.disk_dir / key[:2] / f"{key}{extension}"
+
+    def _expired(self, mtime: float) -> bool:
+        """Check whether a disk entry written at mtime is past the TTL."""
+        return self.ttl_seconds is not None and mtime < time.time() - self.ttl_seconds
+
+    def get(self, key: str):
+        """Return a buffer with the cached image, or None on a miss."""
+        data = self.memory.get(key)
+        if data is not None:
+            return io.BytesIO(data)
+
+        if self.disk_dir is None:
+            return None
+
+        for extension in RESULT_EXTENSIONS:
+            path = self._disk_path(key, extension)
+            try:
+                if self._expired(path.stat().st_mtime):
+                    path.unlink(missing_ok=True)
+                    return None
+                data = path.read_bytes()
+            except FileNotFoundError:
+                continue
+
+            self.memory.put(key, data, len(data))
+            return io.BytesIO(data)
+        return None
+
+    def put(self, key: str, buffer: io.BytesIO) -> None:
+        """Store a rendered image buffer."""
+        data = buffer.getvalue()
+        self.memory.put(key, data, len(data))
+
+        if self.disk_dir is None:
+            return
+
+        path = self._disk_path(key, encoder_for_data(data).extension)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write cached result {key}: {e}")
+        self._schedule_sweep()
+
+    def _schedule_sweep(self) -> None:
+        """Start a background sweep if none ran in the last SWEEP_INTERVAL_SECONDS."""
+        now = time.monotonic()
+        with self._sweep_lock:
+            if self._last_sweep is not None and now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+                return
+            self._last_sweep = now
+        threading.Thread(target=self._sweep_in_background, name="result-sweep", daemon=True).start()
+
+    def _sweep_in_background(self) -> None:
+        """Run a sweep, logging instead of raising."""
+        try:
+            removed = self.sweep()
+        except OSError as e:
+            logger.error(f"Result cache sweep failed: {e}")
+            return
+        if removed:
+            logger.info(f"Result cache sweep removed {removed} files")
+
+    def sweep(self) -> int:
+        """Delete expired disk entries, then the oldest until the tier fits its budget.
+
+        Returns the number of files removed.
+        """
+        if self.disk_dir is None:
+            return 0
+
+        entries = []
+        for path in self.disk_dir.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            over_budget = self.disk_max_bytes is not None and total > self.disk_max_bytes
+            if not over_budget and not self._expired(mtime):
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        """Return counters for the in-memory tier."""
+        return self.memory.stats()
+
+
+result_cache = ResultCache(
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_DIR if RESULT_CACHE_DISK else None,
+    RESULT_CACHE_DISK_MAX_BYTES,
+    RESULT_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,150 @@
+"""Content-hashed, precompressed copies of the static files.
+
+``python -m backend.build_assets`` copies everything under static/ into
+static/dist with the content hash in each file name, writes gzip (and, when
+the ``brotli`` package is installed, brotli) variants of text assets,
+recompresses PNGs losslessly with a WebP alternative, and records the
+mapping in manifest.json. Templates link to assets through asset_url(),
+which falls back to the plain static URL when no build exists.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+from flask import url_for
+from PIL import Image
+
+from backend.config import ASSET_MANIFEST_PATH, ASSETS_DIR, STATIC_DIR
+from backend.utils.logger import get_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger()
+
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+WEBP_QUALITY = 90
+
+_manifest = (None, {})
+
+
+def _optimize_png(data: bytes) -> bytes:
+    """Recompress a PNG losslessly, keeping the original if that is not smaller."""
+    buffer = io.BytesIO()
+    with Image.open(io.BytesIO(data)) as image:
+        image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue() if buffer.tell() < len(data) else data
+
+
+def _webp_variant(data: bytes) -> bytes:
+    """Encode an image as WebP for browsers that accept it."""
+    buffer = io.BytesIO()
+    with Image.open(io.BytesIO(data)) as image:
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+    return buffer.getvalue()
+
+
+def _hashed_name(name: str, data: bytes) -> str:
+    """Insert a content hash before the extension: css/style.css -> css/style.<hash>.css."""
+    path = Path(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+
+def _write_variants(path: Path, data: bytes) -> None:
+    """Write an asset and its precompressed or WebP variants."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if path.suffix == ".png":
+        webp = _webp_variant(data)
+        if len(webp) < len(data):
+            path.with_name(path.name + ".webp").write_bytes(webp)
+    if path.suffix not in COMPRESSIBLE_SUFFIXES:
+        return
+
+    compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed["br"] = brotli.compress(data, quality=11)
+    for encoding, variant in compressed.items():
+        if len(variant) < len(data):
+            path.with_name(path.name + ENCODING_SUFFIXES[encoding]).write_bytes(variant)
+
+
+def build_assets(source_dir: Path = STATIC_DIR, output_dir: Path = ASSETS_DIR) -> dict:
+    """Rebuild the hashed asset directory and return the manifest."""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    manifest = {}
+    for source in sorted(source_dir.rglob("*")):
+        if not source.is_file() or output_dir in source.parents or source.name.startswith("."):
+            continue
+
+        name = source.relative_to(source_dir).as_posix()
+        data = source.read_bytes()
+        if source.suffix.lower() == ".png":
+            data = _optimize_png(data)
+
+        hashed = _hashed_name(name, data)
+        _write_variants(output_dir / hashed, data)
+        manifest[name] = hashed
+        logger.info(f"Asset built: {name} -> {hashed}")
+
+    (output_dir / ASSET_MANIFEST_PATH.name).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+def load_manifest() -> dict:
+    """Return the asset manifest, reloading it when a new build replaces it."""
+    global _manifest
+    try:
+        mtime = os.stat(ASSET_MANIFEST_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    if _manifest[0] != mtime:
+        try:
+            _manifest = (mtime, json.loads(ASSET_MANIFEST_PATH.read_text()))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Could not read asset manifest: {e}")
+            return {}
+    return _manifest[1]
+
+
+def asset_url(name: str) -> str:
+    """Return the URL of a static file's hashed build, or its plain static URL."""
+    hashed = load_manifest().get(name)
+    if hashed is None:
+        return url_for("static", filename=name)
+    return url_for("main.serve_asset", filename=hashed)
+
+
+def choose_variant(path: Path, accept_encodings, accept_mimetypes) -> tuple:
+    """Pick the best variant of an asset the client accepts.
+
+    Returns (file to send, content type, content encoding or None). PNGs
+    are swapped for their WebP variant when image/webp is listed
+    explicitly, since a bare */* does not promise WebP support; text
+    assets use the brotli or gzip variant allowed by Accept-Encoding.
+    """
+    mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+    webp = path.with_name(path.name + ".webp")
+    if path.suffix == ".png" and "image/webp" in accept_mimetypes.values() and webp.exists():
+        return webp, "image/webp", None
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        variant = path.with_name(path.name + suffix)
+        if accept_encodings[encoding] and variant.exists():
+            return variant, mimetype, encoding
+    return path, mimetype, None
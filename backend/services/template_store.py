@@ -0,0 +1,132 @@
+"""Preprocessed templates stored as raw RGBA pixels with a render-plan sidecar.
+
+Prepared pixels are memory-mapped read-only, so gunicorn workers and render
+pool processes share the same physical pages for each template.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from PIL import Image
+
+from backend.config import (
+    PREPARED_TEMPLATES_DIR,
+    DEFAULT_CIRCLE_SIZE_PERCENT,
+    DEFAULT_CIRCLE_Y_PERCENT,
+    DEFAULT_TEXT_Y_PERCENT,
+    DEFAULT_FONT_SIZE_PERCENT,
+)
+from backend.utils.heif import open_image
+from backend.utils.logger import get_logger
+
+logger = get_logger()
+
+
+def _prepared_paths(source: Path) -> tuple:
+    """Return the (pixels, sidecar) paths for a source template."""
+    name = hashlib.sha256(str(Path(source).resolve()).encode("utf-8")).hexdigest()[:16]
+    return PREPARED_TEMPLATES_DIR / f"{name}.rgba", PREPARED_TEMPLATES_DIR / f"{name}.json"
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write a file so readers never see it half-written."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def build_render_plan(width: int, height: int) -> dict:
+    """Precompute the frame-derived sizes and default layout for a template."""
+    return {
+        "width": width,
+        "height": height,
+        "base_font_size": int(width * DEFAULT_FONT_SIZE_PERCENT),
+        "photo_diameter": int(width * DEFAULT_CIRCLE_SIZE_PERCENT),
+        "photo_center": [width // 2, int(height * DEFAULT_CIRCLE_Y_PERCENT)],
+        "text_center": [width // 2, int(height * DEFAULT_TEXT_Y_PERCENT)],
+    }
+
+
+def prepare_template(source: Path) -> dict:
+    """Decode a template once and store its RGBA pixels and render plan.
+
+    Returns the sidecar dict. Raises if the source cannot be decoded.
+    """
+    source = Path(source)
+    stat = os.stat(source)
+    image = open_image(source).convert("RGBA")
+
+    pixels_path, sidecar_path = _prepared_paths(source)
+    PREPARED_TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+
+    sidecar = {
+        "source": str(source),
+        "source_mtime_ns": stat.st_mtime_ns,
+        "source_size": stat.st_size,
+        "mode": "RGBA",
+        "pixels": pixels_path.name,
+        "plan": build_render_plan(*image.size),
+    }
+    write_atomic(pixels_path, image.tobytes())
+    write_atomic(sidecar_path, json.dumps(sidecar, indent=2).encode("utf-8"))
+
+    logger.info(f"Template prepared: {source} ({image.width}x{image.height})")
+    return sidecar
+
+
+def load_sidecar(source: Path):
+    """Return the sidecar for source if its prepared form is current, else None."""
+    _, sidecar_path = _prepared_paths(source)
+    try:
+        with open(sidecar_path, "r") as f:
+            sidecar = json.load(f)
+        stat = os.stat(source)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if sidecar.get("source_mtime_ns") != stat.st_mtime_ns or sidecar.get("source_size") != stat.st_size:
+        return None
+    return sidecar
+
+
+def _map_pixels(path: Path, expected_size: int):
+    """Map a prepared pixels file read-only, or return None if it is incomplete."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size != expected_size:
+            return None
+        return mmap.mmap(f.fileno(), expected_size, access=mmap.ACCESS_READ)
+
+
+def load_prepared_template(source: Path) -> Image.Image:
+    """Return the template's RGBA image backed by its memory-mapped prepared pixels.
+
+    The source is decoded and prepared first if it has no current prepared
+    form. The image wraps the shared page-cache mapping without copying, so
+    every process rendering the same template shares one physical copy of it.
+    The image is read-only; copy it before drawing on it.
+    """
+    sidecar = load_sidecar(source)
+    if sidecar is None:
+        sidecar = prepare_template(source)
+
+    pixels_path, _ = _prepared_paths(source)
+    plan = sidecar["plan"]
+    size = (plan["width"], plan["height"])
+    pixels = _map_pixels(pixels_path, size[0] * size[1] * 4)
+    if pixels is None:
+        logger.warning(f"Prepared pixels for {source} are incomplete, re-preparing")
+        prepare_template(source)
+        pixels = _map_pixels(pixels_path, size[0] * size[1] * 4)
+        if pixels is None:
+            raise OSError(f"Prepared pixels for {source} could not be written")
+
+    return Image.frombuffer("RGBA", size, pixels, "raw", "RGBA", 0, 1)
+
+
+def remove_prepared(source: Path) -> None:
+    """Delete the prepared pixels and sidecar for a source template, if any."""
+    for path in _prepared_paths(source):
+        path.unlink(missing_ok=True)
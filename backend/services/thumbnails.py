@@ -0,0 +1,79 @@
+"""Small WebP and JPEG previews of templates for the gallery, cached on disk."""
+
+import hashlib
+import shutil
+from pathlib import Path
+from PIL import Image
+
+from backend.config import THUMBNAILS_DIR, THUMBNAIL_FORMATS, THUMBNAIL_QUALITY, THUMBNAIL_WIDTHS
+from backend.services.encoders import get_encoder
+from backend.services.template_store import load_prepared_template, write_atomic
+from backend.utils.logger import get_logger
+
+logger = get_logger()
+
+
+def _thumbnail_dir(source: Path) -> Path:
+    """Return the directory holding every thumbnail of a source template."""
+    name = hashlib.sha256(str(Path(source).resolve()).encode("utf-8")).hexdigest()[:16]
+    return THUMBNAILS_DIR / name
+
+
+def thumbnail_path(source: Path, width: int, output_format: str) -> Path:
+    """Return where the thumbnail of source at width in output_format is cached."""
+    return _thumbnail_dir(source) / f"{width}{get_encoder(output_format).extension}"
+
+
+def _render_thumbnail(template: Image.Image, width: int, output_format: str) -> bytes:
+    """Scale an RGBA template to width and encode it; JPEG is flattened onto white."""
+    width = min(width, template.width)
+    height = max(round(template.height * width / template.width), 1)
+    thumbnail = template.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+    if output_format != "webp":
+        background = Image.new("RGB", thumbnail.size, (255, 255, 255))
+        background.paste(thumbnail, mask=thumbnail)
+        thumbnail = background
+
+    return get_encoder(output_format).save(thumbnail, THUMBNAIL_QUALITY).getvalue()
+
+
+def _is_current(path: Path, source: Path) -> bool:
+    """Check whether a cached thumbnail exists and is newer than its source."""
+    try:
+        return path.stat().st_mtime_ns >= Path(source).stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def get_thumbnail(source: Path, width: int, output_format: str) -> Path:
+    """Return the cached thumbnail file, creating it if it is missing or stale.
+
+    Raises ValueError for a width or format that is not offered.
+    """
+    if width not in THUMBNAIL_WIDTHS or output_format not in THUMBNAIL_FORMATS:
+        raise ValueError(f"No {output_format} thumbnail at width {width}")
+
+    path = thumbnail_path(source, width, output_format)
+    if not _is_current(path, source):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, _render_thumbnail(load_prepared_template(source), width, output_format))
+    return path
+
+
+def create_thumbnails(source: Path) -> None:
+    """Generate every offered thumbnail of a template, decoding it once."""
+    template = load_prepared_template(source)
+    directory = _thumbnail_dir(source)
+    directory.mkdir(parents=True, exist_ok=True)
+    for width in THUMBNAIL_WIDTHS:
+        for output_format in THUMBNAIL_FORMATS:
+            path = thumbnail_path(source, width, output_format)
+            if not _is_current(path, source):
+                write_atomic(path, _render_thumbnail(template, width, output_format))
+    logger.info(f"Thumbnails created: {source}")
+
+
+def remove_thumbnails(source: Path) -> None:
+    """Delete every cached thumbnail of a source template."""
+    shutil.rmtree(_thumbnail_dir(source), ignore_errors=True)
@@ -0,0 +1,280 @@
+"""Content-addressed storage for uploaded templates and fonts.
+
+Each distinct file is stored once under a name derived from its SHA-256,
+so re-uploading the same frame or font returns the same id and every
+path-keyed cache (decoded templates, prepared pixels, parsed fonts) is
+shared between the duplicates. Older random ids are kept as aliases of the
+stored file. Saved configurations hold references to uploads; files that
+no configuration references can be removed with ``python -m backend.upload_gc``.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from backend.config import FONTS_DIR, TEMPLATES_DIR, UPLOAD_DB_PATH
+from backend.services.template_store import remove_prepared
+from backend.services.thumbnails import remove_thumbnails
+from backend.utils.logger import get_logger
+from backend.utils.validators import resolve_upload_path
+
+logger = get_logger()
+
+UPLOAD_KINDS = {"template": TEMPLATES_DIR, "font": FONTS_DIR}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def config_references(config) -> list:
+    """Return the (kind, upload id) pairs a saved configuration refers to."""
+    if not config:
+        return []
+    refs = []
+    if config.get("template_id"):
+        refs.append(("template", config["template_id"]))
+    if config.get("font_id"):
+        refs.append(("font", config["font_id"]))
+    return refs
+
+
+class UploadStore:
+    """Uploaded files keyed by content hash, with aliases and reference counts."""
+
+    def __init__(self, db_path: Path, directories: dict = UPLOAD_KINDS):
+        """Open the store and create its tables if needed."""
+        self.db_path = db_path
+        self.directories = directories
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        for directory in directories.values():
+            directory.mkdir(parents=True, exist_ok=True)
+        with self._read() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "kind TEXT NOT NULL, digest TEXT NOT NULL, filename TEXT NOT NULL, size INTEGER NOT NULL, "
+                "refcount INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, PRIMARY KEY (kind, digest))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases ("
+                "kind TEXT NOT NULL, id TEXT NOT NULL, digest TEXT NOT NULL, PRIMARY KEY (kind, id))"
+            )
+
+    @contextmanager
+    def _transaction(self):
+        """Run a write transaction that holds the database write lock throughout."""
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _read(self):
+        """Open a connection for reads."""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _spool(self, kind: str, stream) -> tuple:
+        """Copy stream into a temporary file next to the uploads, hashing it on the way."""
+        directory = self.directories[kind]
+        tmp_path = directory / f".upload.{os.getpid()}.{threading.get_ident()}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        return tmp_path, digest.hexdigest(), size
+
+    def store(self, kind: str, stream, extension: str) -> tuple:
+        """Store an upload once and return (upload id, whether it was new).
+
+        The id is the first 32 hex digits of the content's SHA-256 plus the
+        extension, the same shape as the random ids used before. Uploading
+        content that is already stored returns the existing id and restarts
+        its garbage collection grace period, as if it had just been uploaded.
+        """
+        tmp_path, digest, size = self._spool(kind, stream)
+        try:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT filename FROM blobs WHERE kind = ? AND digest = ?", (kind, digest)
+                ).fetchone()
+                if row is not None and (self.directories[kind] / row[0]).exists():
+                    conn.execute(
+                        "UPDATE blobs SET created_at = ? WHERE kind = ? AND digest = ?", (time.time(), kind, digest)
+                    )
+                    return row[0], False
+
+                filename = f"{digest[:32]}{extension.lower()}"
+                os.replace(tmp_path, self.directories[kind] / filename)
+                conn.execute(
+                    "INSERT OR REPLACE INTO blobs (kind, digest, filename, size, refcount, created_at) "
+                    "VALUES (?, ?, ?, ?, COALESCE((SELECT refcount FROM blobs WHERE kind = ? AND digest = ?), 0), ?)",
+                    (kind, digest, filename, size, kind, digest, time.time()),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO aliases (kind, id, digest) VALUES (?, ?, ?)", (kind, filename, digest)
+                )
+                return filename, True
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def remove(self, kind: str, upload_id: str) -> None:
+        """Delete a stored upload and all of its aliases."""
+        path = self.path(kind, upload_id)
+        with self._transaction() as conn:
+            row = conn.execute("SELECT digest FROM aliases WHERE kind = ? AND id = ?", (kind, upload_id)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM aliases WHERE kind = ? AND digest = ?", (kind, row[0]))
+                conn.execute("DELETE FROM blobs WHERE kind = ? AND digest = ?", (kind, row[0]))
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    def path(self, kind: str, upload_id: str):
+        """Return the stored file for an upload id or alias, or None if it is unknown.
+
+        Ids naming a file in the upload directory, which includes every id
+        returned by store(), resolve without a database lookup.
+        """
+        directory = self.directories[kind]
+        path = resolve_upload_path(directory, upload_id)
+        if path is None:
+            return None
+        if path.exists():
+            return path
+
+        with self._read() as conn:
+            row = conn.execute(
+                "SELECT b.filename FROM aliases a JOIN blobs b ON b.kind = a.kind AND b.digest = a.digest "
+                "WHERE a.kind = ? AND a.id = ?",
+                (kind, path.name),
+            ).fetchone()
+        if row is None:
+            return None
+        path = directory / row[0]
+        return path if path.exists() else None
+
+    def _adjust(self, refs: list, delta: int) -> None:
+        """Add delta to the reference count of each referenced upload."""
+        if not refs:
+            return
+        with self._transaction() as conn:
+            for kind, upload_id in refs:
+                conn.execute(
+                    "UPDATE blobs SET refcount = MAX(refcount + ?, 0) "
+                    "WHERE kind = ? AND digest = (SELECT digest FROM aliases WHERE kind = ? AND id = ?)",
+                    (delta, kind, kind, upload_id),
+                )
+
+    def retain(self, refs: list) -> None:
+        """Count a new reference to each (kind, upload id); unknown ids are ignored."""
+        self._adjust(refs, 1)
+
+    def release(self, refs: list) -> None:
+        """Drop a reference to each (kind, upload id); unknown ids are ignored."""
+        self._adjust(refs, -1)
+
+    def adopt(self) -> int:
+        """Register files saved before content addressing and return how many were found.
+
+        Each file keeps its name as an alias. A file whose content is already
+        stored is deleted, and its name points at the stored copy.
+        """
+        adopted = 0
+        for kind, directory in self.directories.items():
+            with self._read() as conn:
+                known = {row[0] for row in conn.execute("SELECT id FROM aliases WHERE kind = ?", (kind,))}
+
+            for path in sorted(directory.iterdir()):
+                if not path.is_file() or path.name.startswith(".") or path.name in known:
+                    continue
+                with open(path, "rb") as f:
+                    digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+                with self._transaction() as conn:
+                    row = conn.execute(
+                        "SELECT filename FROM blobs WHERE kind = ? AND digest = ?", (kind, digest)
+                    ).fetchone()
+                    if row is None:
+                        conn.execute(
+                            "INSERT INTO blobs (kind, digest, filename, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                            (kind, digest, path.name, path.stat().st_size, path.stat().st_mtime),
+                        )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO aliases (kind, id, digest) VALUES (?, ?, ?)",
+                        (kind, path.name, digest),
+                    )
+
+                if row is not None and row[0] != path.name:
+                    path.unlink(missing_ok=True)
+                    if kind == "template":
+                        remove_prepared(path)
+                        remove_thumbnails(path)
+                    logger.info(f"Upload {path.name} is a duplicate of {row[0]}, now an alias")
+                adopted += 1
+        return adopted
+
+    def recount(self, configs) -> None:
+        """Rebuild every reference count from the given saved configurations."""
+        refs = [ref for config in configs for ref in config_references(config)]
+        with self._transaction() as conn:
+            conn.execute("UPDATE blobs SET refcount = 0")
+        self.retain(refs)
+
+    def collect_garbage(self, grace_seconds: float, dry_run: bool = False) -> list:
+        """Delete unreferenced uploads older than grace_seconds and return their paths.
+
+        The grace period, counted from the last upload of the same content,
+        protects files uploaded for a configuration that has not been saved
+        yet. Files are deleted while the write lock is held, so a concurrent
+        store() cannot hand out an id whose file is about to disappear.
+        """
+        removed = []
+        cutoff = time.time() - grace_seconds
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT kind, digest, filename FROM blobs WHERE refcount = 0 AND created_at < ?", (cutoff,)
+            ).fetchall()
+            for kind, digest, filename in rows:
+                path = self.directories[kind] / filename
+                removed.append(path)
+                if dry_run:
+                    continue
+                conn.execute("DELETE FROM aliases WHERE kind = ? AND digest = ?", (kind, digest))
+                conn.execute("DELETE FROM blobs WHERE kind = ? AND digest = ?", (kind, digest))
+                if kind == "template":
+                    remove_prepared(path)
+                    remove_thumbnails(path)
+                path.unlink(missing_ok=True)
+        return removed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """Return the shared upload store, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UploadStore(UPLOAD_DB_PATH)
+    return _store
@@ -0,0 +1,52 @@
+"""Remove uploaded templates and fonts that no saved configuration uses.
+
+Usage:
+    python -m backend.upload_gc [--dry-run] [--recount] [--grace-hours N]
+
+Files uploaded before content-addressed storage are registered first, and
+duplicates among them are replaced by aliases of a single stored copy.
+Uploads younger than the grace period are kept so a template uploaded for
+a configuration that is still being edited is not removed. Expired rendered
+results are removed from the disk result cache as well.
+"""
+
+import argparse
+import sys
+
+from backend.config import UPLOAD_GC_GRACE_SECONDS
+from backend.routes.admin import get_config_store
+from backend.services.result_cache import result_cache
+from backend.services.upload_store import get_upload_store
+
+
+def main(argv=None) -> int:
+    """Run garbage collection from the command line."""
+    parser = argparse.ArgumentParser(prog="python -m backend.upload_gc", description="Remove unreferenced uploads.")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be removed without removing it")
+    parser.add_argument("--recount", action="store_true", help="rebuild reference counts from saved configurations")
+    parser.add_argument(
+        "--grace-hours", type=float, default=UPLOAD_GC_GRACE_SECONDS / 3600, help="keep uploads younger than this"
+    )
+    args = parser.parse_args(argv)
+
+    store = get_upload_store()
+    adopted = store.adopt()
+    if adopted or args.recount:
+        store.recount(get_config_store().list_all().values())
+    if adopted:
+        print(f"Registered {adopted} existing uploads")
+
+    removed = store.collect_garbage(args.grace_hours * 3600, dry_run=args.dry_run)
+    for path in removed:
+        print(path)
+
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {len(removed)} unreferenced uploads")
+
+    if not args.dry_run and result_cache.disk_dir is not None:
+        print(f"Removed {result_cache.sweep()} expired or excess cached results")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""HEIF/HEIC support for Pillow, loaded the first time a HEIF image is opened.
+
+Importing pillow_heif costs more than the rest of the render pipeline's
+imports together, and most photos are JPEG or PNG.
+"""
+
+import os
+import threading
+from PIL import Image
+
+from backend.utils.validators import sniff_image_type
+
+_registered = False
+_lock = threading.Lock()
+
+
+def register_heif_support() -> None:
+    """Import pillow_heif and register its opener with Pillow, once per process."""
+    global _registered
+    if _registered:
+        return
+    with _lock:
+        if not _registered:
+            from pillow_heif import register_heif_opener
+            register_heif_opener()
+            _registered = True
+
+
+def open_image(source) -> Image.Image:
+    """Open an image like Image.open(), enabling HEIF support first if it is HEIF.
+
+    source is a path or a seekable binary file object.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            image_type = sniff_image_type(f)
+    else:
+        image_type = sniff_image_type(source)
+
+    if image_type == "heif":
+        register_heif_support()
+    return Image.open(source)
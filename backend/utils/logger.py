@@ -1,12 +1,95 @@
-"""Logging setup for the application."""
+"""Logging setup for the application.
 
+Log calls only put the record on an in-memory queue. A listener thread
+formats it and writes it to stdout and the log files, so request threads
+never wait on file I/O or rotation checks.
+"""
+
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 LOGS_DIR = Path(__file__).resolve().parent.parent.parent / "logs"
-LOGS_DIR.mkdir(exist_ok=True)
+
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format each record as a single-line JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Serialize the record's fields and message."""
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records at levels that have a sample rate."""
+
+    def __init__(self, rates: dict):
+        """Create a filter from {level number: fraction of records to keep}."""
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decide whether to keep the record."""
+        rate = self.rates.get(record.levelno)
+        return rate is None or random.random() < rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler merges the message arguments on the calling thread.
+    Passing the record through unchanged keeps %-style log calls lazy, so
+    arguments must not be mutated after they are logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Enqueue the record as is."""
+        return record
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """Parse "INFO=0.1,DEBUG=0" into {level number: rate}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if isinstance(level, int):
+            rates[level] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def _start_listener(log_queue: queue.SimpleQueue, handlers: list) -> None:
+    """Start the thread that writes queued records to the real handlers."""
+    global _listener
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    """Write out any queued records and stop the listener thread."""
+    if _listener is not None:
+        _listener.stop()
 
 
 def setup_logger(name: str = "dp_generator", level: int = logging.INFO) -> logging.Logger:
@@ -17,16 +100,19 @@ def setup_logger(name: str = "dp_generator", level: int = logging.INFO) -> loggi
         return logger
 
     logger.setLevel(level)
+    LOGS_DIR.mkdir(exist_ok=True)
 
-    formatter = logging.Formatter(
-        fmt="%(asctime)s | %(levelname)-8s | %(name)s:%(funcName)s:%(lineno)d | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S")
+    else:
+        formatter = logging.Formatter(
+            fmt="%(asctime)s | %(levelname)-8s | %(name)s:%(funcName)s:%(lineno)d | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
 
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
 
     file_handler = RotatingFileHandler(
         LOGS_DIR / "app.log",
@@ -36,7 +122,6 @@ def setup_logger(name: str = "dp_generator", level: int = logging.INFO) -> loggi
     )
     file_handler.setLevel(level)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
     error_handler = RotatingFileHandler(
         LOGS_DIR / "error.log",
@@ -46,7 +131,17 @@ def setup_logger(name: str = "dp_generator", level: int = logging.INFO) -> loggi
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
-    logger.addHandler(error_handler)
+
+    handlers = [console_handler, file_handler, error_handler]
+    log_queue = queue.SimpleQueue()
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    logger.addHandler(queue_handler)
+
+    _start_listener(log_queue, handlers)
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=lambda: _start_listener(log_queue, handlers))
 
     return logger
 
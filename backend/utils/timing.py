@@ -0,0 +1,33 @@
+"""Per-stage timing of the render pipeline."""
+
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds spent in each named stage."""
+
+    def __init__(self):
+        """Start with no recorded stages."""
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block and add it to the named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add seconds measured elsewhere to the named stage."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add(self, other: "StageTimer") -> None:
+        """Add another timer's stage times to this one."""
+        for name, seconds in other.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+startup_timer = StageTimer()
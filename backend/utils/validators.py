@@ -2,17 +2,48 @@
 
 from pathlib import Path
 from werkzeug.datastructures import FileStorage
-from backend.config import ALLOWED_IMAGE_EXTENSIONS, ALLOWED_FONT_EXTENSIONS, MAX_CONTENT_LENGTH
+from werkzeug.utils import secure_filename
+from backend.config import ALLOWED_IMAGE_EXTENSIONS, ALLOWED_FONT_EXTENSIONS, MAX_CONTENT_LENGTH, OUTPUT_FORMATS
 from backend.utils.logger import get_logger
 
 logger = get_logger()
 
+POSITION_PARAM_KEYS = [
+    "image_x", "image_y", "image_size", "image_shape", "text_x", "text_y", "font_size", "text_color",
+]
+
+OUTPUT_PARAM_KEYS = ["output_format", "quality", "target_kb", "preview"]
+
+
+HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
 
 class ValidationError(Exception):
     """Custom validation error."""
     pass
 
 
+def sniff_image_type(stream):
+    """Identify an image from its leading magic bytes without decoding it.
+
+    Returns "jpeg", "png", "webp" or "heif", or None if the header matches none
+    of them. The stream position is restored.
+    """
+    position = stream.tell()
+    header = stream.read(16)
+    stream.seek(position)
+
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    if header[4:8] == b"ftyp" and header[8:12] in HEIF_BRANDS:
+        return "heif"
+    return None
+
+
 def validate_image_file(file: FileStorage, max_size: int = MAX_CONTENT_LENGTH) -> None:
     """Validate an uploaded image file."""
     if not file or file.filename == "":
@@ -34,7 +65,11 @@ def validate_image_file(file: FileStorage, max_size: int = MAX_CONTENT_LENGTH) -
         logger.warning(f"Image validation failed: File too large ({size} bytes)")
         raise ValidationError(f"File too large. Maximum size: {max_size // (1024*1024)}MB")
 
-    logger.info(f"Image validated: {filename} ({size} bytes)")
+    if sniff_image_type(file.stream) is None:
+        logger.warning(f"Image validation failed: Unrecognized content in '{filename}'")
+        raise ValidationError("File content is not a supported image")
+
+    logger.info("Image validated: %s (%d bytes)", filename, size)
 
 
 def validate_font_file(file: FileStorage, max_size: int = 10 * 1024 * 1024) -> None:
@@ -61,6 +96,14 @@ def validate_font_file(file: FileStorage, max_size: int = 10 * 1024 * 1024) -> N
     logger.info(f"Font validated: {filename} ({size} bytes)")
 
 
+def resolve_upload_path(directory: Path, file_id: str):
+    """Resolve an uploaded file id inside directory, or None if it escapes it."""
+    path = (directory / secure_filename(file_id)).resolve()
+    if not str(path).startswith(str(directory.resolve())):
+        return None
+    return path
+
+
 def validate_position_params(params: dict) -> dict:
     """Validate and sanitize position parameters."""
     sanitized = {}
@@ -138,5 +181,42 @@ def validate_position_params(params: dict) -> dict:
                     logger.warning(f"Invalid text_color hex: {color}")
                     raise ValidationError("Invalid text_color format")
 
-    logger.info(f"Position params validated: {sanitized}")
+    logger.debug("Position params validated: %s", sanitized)
+    return sanitized
+
+
+def validate_output_params(params: dict) -> dict:
+    """Validate and sanitize output encoding parameters."""
+    sanitized = {}
+
+    if params.get("output_format"):
+        output_format = str(params["output_format"]).lower()
+        if output_format not in OUTPUT_FORMATS:
+            logger.warning(f"Invalid output_format value: {params.get('output_format')}")
+            raise ValidationError(f"output_format must be one of: {', '.join(OUTPUT_FORMATS)}")
+        sanitized["output_format"] = output_format
+
+    if params.get("quality") not in (None, ""):
+        try:
+            value = int(params["quality"])
+            if not 1 <= value <= 100:
+                raise ValidationError("quality must be between 1 and 100")
+            sanitized["quality"] = value
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid quality value: {params.get('quality')}")
+            raise ValidationError("Invalid quality value")
+
+    if params.get("target_kb") not in (None, ""):
+        try:
+            value = int(params["target_kb"])
+            if not 5 <= value <= MAX_CONTENT_LENGTH // 1024:
+                raise ValidationError("target_kb is out of range")
+            sanitized["target_kb"] = value
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid target_kb value: {params.get('target_kb')}")
+            raise ValidationError("Invalid target_kb value")
+
+    if "preview" in params:
+        sanitized["preview"] = str(params["preview"]).lower() in ("1", "true", "yes", "on")
+
     return sanitized
@@ -2,21 +2,34 @@
 
 import os
 import sys
+import time
+
+_import_started = time.perf_counter()
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from flask import Flask, request, jsonify
-from backend.config import Config
+from werkzeug.exceptions import HTTPException
+from backend.config import Config, METRICS_DIR, METRICS_ENABLED
 from backend.routes import api_bp, main_bp, admin_bp
+from backend.services.metrics import init_metrics, observe
+from backend.services.static_assets import asset_url
 from backend.utils import setup_logger
+from backend.utils.timing import startup_timer
 
+startup_timer.record("import", time.perf_counter() - _import_started)
 logger = setup_logger()
 
 
 def create_app(config_class=Config):
     """Application factory for creating the Flask app."""
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.add_template_global(asset_url)
+
+    if METRICS_ENABLED:
+        init_metrics(METRICS_DIR)
 
     app.register_blueprint(admin_bp)
     app.register_blueprint(api_bp)
@@ -25,7 +38,14 @@ def create_app(config_class=Config):
     register_error_handlers(app)
     register_legacy_routes(app)
 
-    logger.info("Application initialized successfully")
+    startup_timer.record("create_app", time.perf_counter() - started)
+    for phase in ("import", "create_app"):
+        observe("dp_startup_seconds", startup_timer.stages[phase], phase=phase)
+
+    logger.info(
+        "Application initialized in %.0f ms (imports %.0f ms)",
+        startup_timer.stages["create_app"] * 1000, startup_timer.stages["import"] * 1000,
+    )
     return app
 
 
@@ -55,11 +75,9 @@ def register_error_handlers(app):
 
 def register_legacy_routes(app):
     """Register backward-compatible routes from old API."""
-    from backend.services import ImageProcessor
+    from backend.routes.api import get_processor
     from backend.utils.validators import ValidationError, validate_image_file
 
-    processor = ImageProcessor()
-
     @app.route("/process-image", methods=["POST"])
     def legacy_process():
         """Legacy endpoint for backward compatibility."""
@@ -74,14 +92,15 @@ def register_legacy_routes(app):
             if not username:
                 return jsonify({"error": "Username is required"}), 400
 
-            image_data = uploaded_file.read()
-            result = processor.process(image_data=image_data, username=username)
+            result = get_processor().process(image_data=uploaded_file.stream, username=username)
 
             return jsonify({"image": result})
 
         except ValidationError as e:
             logger.warning(f"Validation error: {e}")
             return jsonify({"error": "Invalid input provided"}), 400
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Legacy processing failed: {e}", exc_info=True)
             return jsonify({"error": "Failed to process image"}), 500
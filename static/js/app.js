@@ -10,6 +10,7 @@ const CONFIG = {
 
 const state = {
   selectedImage: null,
+  photoToken: null,
   processedImageData: null,
   adminConfig: null,
 };
@@ -158,9 +159,87 @@ function setupPhotoUpload() {
     filenameElement.textContent = file.name;
     filenameElement.classList.remove('hidden');
     state.selectedImage = file;
+    state.photoToken = null;
   }
 }
 
+function appendConfigFields(formData) {
+  if (state.adminConfig) {
+    if (state.adminConfig.template_id) {
+      formData.append('template_id', state.adminConfig.template_id);
+    }
+    if (state.adminConfig.font_id) {
+      formData.append('font_id', state.adminConfig.font_id);
+    }
+    if (state.adminConfig.image_x) {
+      formData.append('image_x', state.adminConfig.image_x);
+    }
+    if (state.adminConfig.image_y) {
+      formData.append('image_y', state.adminConfig.image_y);
+    }
+    if (state.adminConfig.image_size) {
+      formData.append('image_size', state.adminConfig.image_size);
+    }
+    if (state.adminConfig.image_shape) {
+      formData.append('image_shape', state.adminConfig.image_shape);
+    }
+    if (state.adminConfig.text_y) {
+      formData.append('text_y', state.adminConfig.text_y);
+    }
+    if (state.adminConfig.font_size) {
+      formData.append('font_size', state.adminConfig.font_size);
+    }
+    if (state.adminConfig.text_color) {
+      formData.append('text_color', state.adminConfig.text_color);
+    }
+    if (state.adminConfig.output_format) {
+      formData.append('output_format', state.adminConfig.output_format);
+    }
+    if (state.adminConfig.quality) {
+      formData.append('quality', state.adminConfig.quality);
+    }
+    if (state.adminConfig.target_kb) {
+      formData.append('target_kb', state.adminConfig.target_kb);
+    }
+  }
+}
+
+async function ensurePhotoSession() {
+  if (state.photoToken) {
+    return state.photoToken;
+  }
+
+  const formData = new FormData();
+  formData.append('image', state.selectedImage);
+  appendConfigFields(formData);
+
+  const response = await fetch('/api/photo-sessions', {
+    method: 'POST',
+    body: formData,
+  });
+
+  const data = await response.json();
+
+  if (!response.ok) {
+    throw new Error(data.error || 'Failed to upload photo');
+  }
+
+  state.photoToken = data.photo_token;
+  return state.photoToken;
+}
+
+async function requestRender(username) {
+  const formData = new FormData();
+  formData.append('photo_token', await ensurePhotoSession());
+  formData.append('username', username);
+  appendConfigFields(formData);
+
+  return fetch('/api/process-image', {
+    method: 'POST',
+    body: formData,
+  });
+}
+
 async function generateDP() {
   const username = elements.usernameInput.value.trim();
 
@@ -180,45 +259,12 @@ async function generateDP() {
   showLoading();
 
   try {
-    const formData = new FormData();
-    formData.append('image', state.selectedImage);
-    formData.append('username', username);
-
-    if (state.adminConfig) {
-      if (state.adminConfig.template_id) {
-        formData.append('template_id', state.adminConfig.template_id);
-      }
-      if (state.adminConfig.font_id) {
-        formData.append('font_id', state.adminConfig.font_id);
-      }
-      if (state.adminConfig.image_x) {
-        formData.append('image_x', state.adminConfig.image_x);
-      }
-      if (state.adminConfig.image_y) {
-        formData.append('image_y', state.adminConfig.image_y);
-      }
-      if (state.adminConfig.image_size) {
-        formData.append('image_size', state.adminConfig.image_size);
-      }
-      if (state.adminConfig.image_shape) {
-        formData.append('image_shape', state.adminConfig.image_shape);
-      }
-      if (state.adminConfig.text_y) {
-        formData.append('text_y', state.adminConfig.text_y);
-      }
-      if (state.adminConfig.font_size) {
-        formData.append('font_size', state.adminConfig.font_size);
-      }
-      if (state.adminConfig.text_color) {
-        formData.append('text_color', state.adminConfig.text_color);
-      }
+    let response = await requestRender(username);
+    if (response.status === 404 && state.photoToken) {
+      state.photoToken = null;
+      response = await requestRender(username);
     }
 
-    const response = await fetch('/api/process-image', {
-      method: 'POST',
-      body: formData,
-    });
-
     const data = await response.json();
 
     if (!response.ok) {
@@ -245,15 +291,18 @@ async function generateDP() {
 function downloadImage() {
   const link = document.createElement('a');
   link.href = elements.previewImage.src;
+  const mimeMatch = /^data:image\/([a-z]+)/.exec(elements.previewImage.src);
+  const extension = mimeMatch ? mimeMatch[1].replace('jpeg', 'jpg') : 'jpg';
   const filename = state.adminConfig?.conference_name
-    ? `${state.adminConfig.conference_name.toLowerCase().replace(/\s+/g, '-')}-dp.png`
-    : 'my-dp.png';
+    ? `${state.adminConfig.conference_name.toLowerCase().replace(/\s+/g, '-')}-dp.${extension}`
+    : `my-dp.${extension}`;
   link.download = filename;
   link.click();
 }
 
 function resetForm() {
   state.selectedImage = null;
+  state.photoToken = null;
   state.processedImageData = null;
 
   elements.usernameInput.value = '';
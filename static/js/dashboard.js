@@ -10,6 +10,8 @@ const CONFIG = {
   DUMMY_NAME: 'John Doe',
 };
 
+const DEMO_TEMPLATE_URL = document.currentScript?.dataset.demoTemplate || '/static/assets/demo.png';
+
 const state = {
   templateId: null,
   fontId: null,
@@ -223,7 +225,7 @@ function loadDefaultImages() {
     state.templateImage = templateImg;
     drawPreview();
   };
-  templateImg.src = '/static/assets/demo.png';
+  templateImg.src = DEMO_TEMPLATE_URL;
 
   createDummyPhoto();
 }
@@ -3,8 +3,12 @@
  */
 
 const state = {
-  templates: [],
-  filteredTemplates: [],
+  templates: {},
+  thumbnails: {},
+  total: 0,
+  nextUrl: null,
+  query: '',
+  searchTimer: null,
   selectedTemplate: null,
   deleteTargetId: null,
 };
@@ -14,6 +18,8 @@ const elements = {
   emptyState: document.getElementById('emptyState'),
   templatesLoading: document.getElementById('templatesLoading'),
   templatesCount: document.getElementById('countNumber'),
+  loadMore: document.getElementById('templatesMore'),
+  loadMoreBtn: document.getElementById('loadMoreBtn'),
   searchInput: document.getElementById('searchInput'),
   templateModal: document.getElementById('templateModal'),
   modalClose: document.getElementById('modalClose'),
@@ -87,7 +93,13 @@ function getTemplateLink(configId) {
   return `${window.location.origin}/generate-dp?config=${configId}`;
 }
 
-function createTemplateCard(template, configId) {
+function thumbnailSrcset(urls) {
+  return Object.entries(urls)
+    .map(([width, url]) => `${url} ${width}w`)
+    .join(', ');
+}
+
+function createTemplateCard(template, configId, thumbnails) {
   const card = document.createElement('div');
   card.className = 'template-card';
   card.dataset.configId = configId;
@@ -100,7 +112,11 @@ function createTemplateCard(template, configId) {
 
   card.innerHTML = `
     <div class="template-card-preview">
-      <span class="preview-placeholder">Preview</span>
+      <picture>
+        <source type="image/webp" srcset="${thumbnailSrcset(thumbnails.webp)}" sizes="320px">
+        <img src="${thumbnails.jpeg['320']}" srcset="${thumbnailSrcset(thumbnails.jpeg)}" sizes="320px"
+          alt="" loading="lazy" decoding="async">
+      </picture>
     </div>
     <div class="template-card-body">
       <h3 class="template-card-title">${escapeHtml(templateName)}</h3>
@@ -163,21 +179,41 @@ function escapeHtml(text) {
   return div.innerHTML;
 }
 
-async function loadTemplates() {
+function galleryUrl() {
+  const params = new URLSearchParams({ sort: 'newest' });
+  if (state.query) {
+    params.set('q', state.query);
+  }
+  return `/api/gallery?${params}`;
+}
+
+async function loadTemplates(url = galleryUrl()) {
+  const firstPage = !url.includes('page=');
   elements.templatesLoading.classList.add('show');
-  elements.templatesGrid.innerHTML = '';
-  elements.emptyState.classList.remove('show');
+  elements.loadMore.classList.remove('show');
+  if (firstPage) {
+    state.templates = {};
+    state.thumbnails = {};
+    elements.templatesGrid.innerHTML = '';
+    elements.emptyState.classList.remove('show');
+  }
 
   try {
-    const response = await fetch('/api/list-configs');
+    const response = await fetch(url);
 
     if (!response.ok) {
       throw new Error('Failed to load templates');
     }
 
     const data = await response.json();
-    state.templates = data.configs || {};
-    state.filteredTemplates = Object.entries(state.templates);
+    state.total = data.total;
+    state.nextUrl = data.next;
+
+    data.items.forEach((item) => {
+      state.templates[item.config_id] = item.config;
+      state.thumbnails[item.config_id] = item.thumbnails;
+      elements.templatesGrid.appendChild(createTemplateCard(item.config, item.config_id, item.thumbnails));
+    });
 
     renderTemplates();
   } catch (error) {
@@ -189,44 +225,17 @@ async function loadTemplates() {
 }
 
 function renderTemplates() {
-  elements.templatesGrid.innerHTML = '';
-
-  const templates = state.filteredTemplates;
-  elements.templatesCount.textContent = templates.length;
-
-  if (templates.length === 0) {
-    elements.emptyState.classList.add('show');
-    return;
-  }
-
-  elements.emptyState.classList.remove('show');
-
-  templates.sort((a, b) => {
-    const dateA = new Date(a[1].created_at || 0);
-    const dateB = new Date(b[1].created_at || 0);
-    return dateB - dateA;
-  });
-
-  templates.forEach(([configId, template]) => {
-    const card = createTemplateCard(template, configId);
-    elements.templatesGrid.appendChild(card);
-  });
+  elements.templatesCount.textContent = state.total;
+  elements.emptyState.classList.toggle('show', Object.keys(state.templates).length === 0);
+  elements.loadMore.classList.toggle('show', Boolean(state.nextUrl));
 }
 
 function filterTemplates(query) {
-  const searchTerm = query.toLowerCase().trim();
-
-  if (!searchTerm) {
-    state.filteredTemplates = Object.entries(state.templates);
-  } else {
-    state.filteredTemplates = Object.entries(state.templates).filter(([configId, template]) => {
-      const templateName = (template.template_name || '').toLowerCase();
-      const conferenceName = (template.conference_name || '').toLowerCase();
-      return templateName.includes(searchTerm) || conferenceName.includes(searchTerm);
-    });
-  }
-
-  renderTemplates();
+  clearTimeout(state.searchTimer);
+  state.searchTimer = setTimeout(() => {
+    state.query = query.trim();
+    loadTemplates();
+  }, 250);
 }
 
 async function copyTemplateLink(configId) {
@@ -264,13 +273,8 @@ function openTemplateModal(configId) {
   elements.modalDate.textContent = `Created: ${formatDateTime(template.created_at)}`;
   elements.modalLink.value = getTemplateLink(configId);
 
-  if (template.template_id) {
-    elements.modalPreview.src = `/api/uploads/templates/${template.template_id}`;
-    elements.modalPreview.style.display = 'block';
-  } else {
-    elements.modalPreview.src = '/static/assets/demo.png';
-    elements.modalPreview.style.display = 'block';
-  }
+  elements.modalPreview.src = state.thumbnails[configId].webp['640'];
+  elements.modalPreview.style.display = 'block';
 
   elements.modalConfig.innerHTML = `
     <div class="config-item">
@@ -335,7 +339,9 @@ async function deleteTemplate() {
     }
 
     delete state.templates[state.deleteTargetId];
-    state.filteredTemplates = Object.entries(state.templates);
+    delete state.thumbnails[state.deleteTargetId];
+    elements.templatesGrid.querySelector(`[data-config-id="${state.deleteTargetId}"]`)?.remove();
+    state.total -= 1;
 
     closeDeleteModal();
     closeTemplateModal();
@@ -366,6 +372,12 @@ function setupEventListeners() {
     filterTemplates(e.target.value);
   });
 
+  elements.loadMoreBtn.addEventListener('click', () => {
+    if (state.nextUrl) {
+      loadTemplates(state.nextUrl);
+    }
+  });
+
   elements.modalClose.addEventListener('click', closeTemplateModal);
   elements.templateModal.addEventListener('click', (e) => {
     if (e.target === elements.templateModal) closeTemplateModal();